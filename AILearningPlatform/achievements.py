@@ -0,0 +1,174 @@
+"""
+Achievement rules engine for the e-learning platform.
+
+Routes report domain events (login, enroll, progress, quiz_result) with the
+facts they already know, and the rules registered here decide which badges
+those facts earn. The Achievement catalog is kept in memory, so an event
+that earns nothing costs no queries; otherwise one query finds the badges
+the user already has and one idempotent bulk insert awards the rest. The
+awards and their counters join the caller's transaction. Adding a badge
+means adding a rule here, not editing routes.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from counters import count_awards
+from extensions import db
+from models import Achievement, UserAchievement, Enrollment
+from utils import conflict_insert
+
+# Badge edits made through another worker process are picked up after this
+REGISTRY_TTL_SECONDS = 300
+
+SESSION_CHANGED_KEY = 'achievements_changed'
+
+Rule = namedtuple('Rule', ['badge_id', 'events', 'check'])
+
+RULES = []
+
+
+def rule(badge_id, *events):
+    """Register check(facts) as the condition for earning badge_id on the given events."""
+    def register(check):
+        RULES.append(Rule(badge_id, frozenset(events), check))
+        return check
+    return register
+
+
+@rule('badge-first-steps', 'enroll')
+def first_enrollment(facts):
+    return True
+
+
+@rule('badge-perfect-score', 'progress', 'quiz_result')
+def perfect_score(facts):
+    return facts.get('score') == 100
+
+
+@rule('badge-course-graduate', 'progress', 'quiz_result')
+def course_graduate(facts):
+    return bool(facts.get('course_completed'))
+
+
+@rule('badge-learning-enthusiast', 'progress', 'quiz_result')
+def learning_enthusiast(facts):
+    return facts.get('completed_courses', 0) >= 5
+
+
+@rule('badge-weekly-warrior', 'login')
+def weekly_warrior(facts):
+    return facts.get('max_streak', 0) >= 7
+
+
+@rule('badge-monthly-master', 'login')
+def monthly_master(facts):
+    return facts.get('max_streak', 0) >= 30
+
+
+# (built_at, {badge_id: badge}), swapped atomically
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def build_registry():
+    """Load the badge catalog in one query."""
+    return {
+        achievement.badge_id: {
+            'id': achievement.id,
+            'badge_id': achievement.badge_id,
+            'title': achievement.title,
+            'description': achievement.description
+        }
+        for achievement in Achievement.query.filter(Achievement.badge_id.isnot(None)).all()
+    }
+
+
+def get_registry():
+    """Return {badge_id: badge} for every badge. Callers must not mutate it."""
+    global _registry
+    registry = _registry
+    if registry is not None and time.monotonic() - registry[0] <= REGISTRY_TTL_SECONDS:
+        return registry[1]
+    with _registry_lock:
+        if _registry is None or time.monotonic() - _registry[0] > REGISTRY_TTL_SECONDS:
+            badges = build_registry()
+            _registry = (time.monotonic(), badges)
+            logging.debug(f"Badge registry built with {len(badges)} badges")
+        return _registry[1]
+
+
+def invalidate_registry():
+    global _registry
+    _registry = None
+
+
+def count_completed_courses(user_id):
+    """Number of courses the user has completed; report it as the completed_courses fact."""
+    return Enrollment.query.filter(Enrollment.user_id == user_id, Enrollment.completion >= 1.0).count()
+
+
+def record_event(user_id, event_name, **facts):
+    """Award every badge the event earns that the user does not have yet.
+
+    Requires an app context; the awards join the caller's transaction, so
+    the caller commits. Returns the newly awarded badges in rule order.
+    """
+    candidates = [r.badge_id for r in RULES if event_name in r.events and r.check(facts)]
+    if not candidates:
+        return []
+
+    registry = get_registry()
+    badges = [registry[badge_id] for badge_id in candidates if badge_id in registry]
+    if not badges:
+        return []
+
+    earned = {achievement_id for (achievement_id,) in db.session.query(
+        UserAchievement.achievement_id
+    ).filter(
+        UserAchievement.user_id == user_id,
+        UserAchievement.achievement_id.in_([badge['id'] for badge in badges])
+    ).all()}
+    awarded = [badge for badge in badges if badge['id'] not in earned]
+    if awarded:
+        # Concurrent requests may award the same badge; the unique index keeps one,
+        # and only the rows actually inserted are reported and counted
+        now = datetime.utcnow()
+        inserted = {achievement_id for (achievement_id,) in db.session.execute(
+            conflict_insert(UserAchievement).values([
+                {'user_id': user_id, 'achievement_id': badge['id'], 'earned_date': now}
+                for badge in awarded
+            ]).on_conflict_do_nothing(
+                index_elements=['user_id', 'achievement_id']
+            ).returning(UserAchievement.achievement_id)
+        )}
+        count_awards(db.session.connection(), inserted)
+        awarded = [badge for badge in awarded if badge['id'] in inserted]
+    return awarded
+
+
+# Invalidate only once a badge change has actually been committed
+def _track_badge_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info[SESSION_CHANGED_KEY] = True
+
+
+for _operation in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Achievement, _operation, _track_badge_change)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop(SESSION_CHANGED_KEY, False):
+        invalidate_registry()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop(SESSION_CHANGED_KEY, None)
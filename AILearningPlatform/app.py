@@ -20,6 +20,8 @@ logging.basicConfig(level=logging.DEBUG)
 from models import User, Course, Module, Quiz, Enrollment, Progress, Achievement, UserAchievement, Streak, Certificate
 from routes import routes_bp
 from database import init_sample_data
+from passwords import PasswordHashingBusy
+import identity  # registers the user_loader
 
 def create_app(config=None):
     """Factory function to create and configure the Flask application"""
@@ -43,7 +45,11 @@ def create_app(config=None):
         MAIL_PASSWORD=os.environ.get('MAIL_PASSWORD', ''),
         MAIL_DEFAULT_SENDER=os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@learnify.com'),
         # Rate limiting
-        RATELIMIT_DEFAULT='200 per day;50 per hour'
+        RATELIMIT_DEFAULT='200 per day;50 per hour',
+        # Certificate file offload: X-Sendfile (Apache/lighttpd) or an
+        # X-Accel-Redirect internal location prefix (nginx)
+        USE_X_SENDFILE=os.environ.get('USE_X_SENDFILE', 'false').lower() in ['true', 'on', '1'],
+        CERTIFICATE_ACCEL_REDIRECT=os.environ.get('CERTIFICATE_ACCEL_REDIRECT')
     )
     
     # Override with any custom config
@@ -105,6 +111,12 @@ def create_app(config=None):
         db.session.rollback()
         return render_template('500.html'), 500
     
+    @app.errorhandler(PasswordHashingBusy)
+    def password_hashing_busy(error):
+        # Shed logins while the hashing pool is full instead of queueing them
+        db.session.rollback()
+        return render_template('503.html'), 503, {'Retry-After': '5'}
+    
     # Context processor to make current_user available in all templates
     @app.context_processor
     def inject_user():
@@ -112,11 +124,6 @@ def create_app(config=None):
             
     return app
 
-@login_manager.user_loader
-def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
-
 def init_db():
     """
     Initialize the database with sample data.
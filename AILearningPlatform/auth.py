@@ -1,15 +1,16 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_from_directory, abort
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from extensions import db, mail, limiter
+from extensions import db, limiter
 from models import User, Course, Enrollment, Certificate
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 from datetime import datetime, timedelta
 import secrets
 import os
-from flask_mail import Message
 from functools import wraps
 from sqlalchemy.exc import SQLAlchemyError
+from certificate import lookup_certificate
+from email_outbox import queue_email
 
 # Create auth blueprint
 auth_bp = Blueprint('auth', __name__)
@@ -31,22 +32,18 @@ def send_verification_email(user):
     token = generate_verification_token(user.email)
     user.email_verification_token = token
     user.email_verification_sent_at = datetime.utcnow()
-    db.session.commit()
     
     verification_url = url_for('auth.verify_email', token=token, _external=True)
     
-    msg = Message('Verify Your Email - Learnify',
-                  recipients=[user.email])
-    msg.body = f'''To verify your email, visit the following link:
+    body = f'''To verify your email, visit the following link:
 {verification_url}
 
 If you did not make this request, please ignore this email.
 '''
     
-    try:
-        mail.send(msg)
-    except Exception as e:
-        current_app.logger.error(f"Failed to send verification email: {e}")
+    # Sent by the outbox sender once this commit succeeds
+    queue_email([user.email], 'Verify Your Email - Learnify', body=body)
+    db.session.commit()
 
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
@@ -170,8 +167,8 @@ def verify_certificate():
         return render_template('verify_certificate.html', certificate=None)
     
     try:
-        # Find certificate by verification code
-        certificate = Certificate.query.filter_by(verification_code=code).first()
+        # Unknown codes are rejected by the verification filter without a query
+        certificate = lookup_certificate(code)
         
         if not certificate:
             return render_template(
@@ -180,18 +177,6 @@ def verify_certificate():
                 error='Invalid verification code. Please check and try again.'
             )
         
-        # If certificate URL doesn't exist, generate the PDF
-        if not certificate.certificate_url or not os.path.exists(certificate.certificate_url):
-            try:
-                certificate.generate_pdf()
-            except Exception as e:
-                current_app.logger.error(f"Error generating certificate PDF: {e}")
-                return render_template(
-                    'verify_certificate.html',
-                    certificate=None,
-                    error='Error generating certificate. Please contact support.'
-                )
-        
         return render_template('verify_certificate.html', certificate=certificate)
     
     except SQLAlchemyError as e:
@@ -0,0 +1,94 @@
+"""
+Benchmark for certificate rendering.
+
+Compares the previous renderer, which rebuilt the canvas, border, static text
+and fonts for every certificate, with certificate_generator's cached base
+layer (render_certificate_image). Reports certificates per second for drawing
+alone and for drawing plus the JPEG encode (encode_certificate) that
+render_certificate() performs.
+
+Usage: python benchmark_certificates.py [--count 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+import certificate_generator
+
+
+def render_uncached(student_name, course_name, certificate_number, date):
+    """The renderer as it was before the base layer cache: draw everything."""
+    width, height = 2000, 1414
+    template = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(template)
+    border_color = (70, 130, 180)
+    draw.rectangle([(50, 50), (width-50, height-50)], outline=border_color, width=10)
+    draw.line([(width//4, 450), (3*width//4, 450)], fill=border_color, width=5)
+    try:
+        title_font = ImageFont.truetype("arial.ttf", 80)
+        name_font = ImageFont.truetype("arial.ttf", 70)
+        text_font = ImageFont.truetype("arial.ttf", 50)
+        small_font = ImageFont.truetype("arial.ttf", 30)
+    except OSError:
+        title_font = name_font = text_font = small_font = ImageFont.load_default()
+
+    def centered(text, font):
+        bbox = draw.textbbox((0, 0), text, font=font)
+        return (width - (bbox[2] - bbox[0])) // 2
+
+    title = "CERTIFICATE OF COMPLETION"
+    draw.text((centered(title, title_font), 350), title, font=title_font, fill=border_color)
+    cert_text = "This is to certify that"
+    draw.text((centered(cert_text, text_font), 500), cert_text, font=text_font, fill="black")
+    name_bbox = draw.textbbox((0, 0), student_name, font=name_font)
+    name_width = name_bbox[2] - name_bbox[0]
+    name_x = (width - name_width) // 2
+    draw.rectangle(
+        [name_x - 20, 650 - 20, name_x + name_width + 20, 650 + (name_bbox[3] - name_bbox[1]) + 20],
+        fill=(240, 248, 255)
+    )
+    draw.text((name_x, 650), student_name, font=name_font, fill=border_color)
+    complete_text = "has successfully completed the course"
+    draw.text((centered(complete_text, text_font), 750), complete_text, font=text_font, fill="black")
+    draw.text((centered(course_name, text_font), 950), course_name, font=text_font, fill=border_color)
+    date_text = f"on {date}"
+    draw.text((centered(date_text, text_font), 1100), date_text, font=text_font, fill="black")
+    draw.text((width - 600, height - 100), f"Certificate ID: {certificate_number}", font=small_font, fill="gray")
+    return template
+
+
+def per_second(render, jobs, with_encode):
+    start = time.perf_counter()
+    for job in jobs:
+        image = render(*job)
+        if with_encode:
+            certificate_generator.encode_certificate(image)
+    return len(jobs) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=50, help='certificates rendered per measurement')
+    args = parser.parse_args()
+
+    jobs = [(f"Student {i}", f"Course {i % 7}", f"code-{i:06d}", "January 01, 2025") for i in range(args.count)]
+
+    # Warm the cache and check both renderers produce the same pixels
+    cached = certificate_generator.render_certificate_image(*jobs[0])
+    assert ImageChops.difference(cached, render_uncached(*jobs[0])).getbbox() is None, "renderers disagree"
+
+    print(f"{'measurement':<20}{'before (cert/s)':>18}{'after (cert/s)':>18}{'speedup':>10}")
+    for label, with_encode in (('draw only', False), ('draw + JPEG', True)):
+        before = per_second(render_uncached, jobs, with_encode)
+        after = per_second(certificate_generator.render_certificate_image, jobs, with_encode)
+        print(f"{label:<20}{before:>18.1f}{after:>18.1f}{after / before:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
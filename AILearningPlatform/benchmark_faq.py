@@ -0,0 +1,78 @@
+"""
+Benchmark for the chatbot FAQ matcher.
+
+Compares the previous full iterrows() scan with the inverted keyword index
+built by chatbot.build_faq_index() on synthetic FAQs of 10k and 100k rows.
+
+Usage: python benchmark_faq.py [--rows 10000 100000] [--messages 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+import chatbot
+
+VOCABULARY = [f"term{i}" for i in range(5000)]
+
+
+def make_faq(rows, rng):
+    return pd.DataFrame({
+        'Question': [f"Question {i}" for i in range(rows)],
+        'Answer': [f"Answer {i}" for i in range(rows)],
+        'Keywords': [rng.sample(VOCABULARY, 4) for _ in range(rows)],
+    })
+
+
+def scan_match(data, user_message_lower):
+    """The matcher as it was before the index: score every row."""
+    user_keywords = set(user_message_lower.split())
+    best_match_score = 0
+    best_response = None
+    for index, row in data.iterrows():
+        if not row['Keywords']:
+            continue
+        common_keywords = user_keywords.intersection(set(row['Keywords']))
+        if len(common_keywords) > best_match_score:
+            best_match_score = len(common_keywords)
+            best_response = row['Answer']
+    return best_response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--messages', type=int, default=200, help='messages matched per measurement')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    print(f"{'rows':>8}{'scan (ms/msg)':>16}{'index (ms/msg)':>16}{'build (ms)':>12}{'speedup':>10}")
+    for rows in args.rows:
+        data = make_faq(rows, rng)
+        messages = [' '.join(['how', 'do', 'i'] + rng.sample(VOCABULARY, 3)) for _ in range(args.messages)]
+
+        start = time.perf_counter()
+        chatbot.faq_lookup = chatbot.build_faq_index(data)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        # The scan is slow enough that a handful of messages gives a stable figure
+        scan_messages = messages[:max(1, args.messages // 40)]
+        start = time.perf_counter()
+        expected = [scan_match(data, message) for message in scan_messages]
+        scan_ms = (time.perf_counter() - start) * 1000 / len(scan_messages)
+
+        start = time.perf_counter()
+        matched = [chatbot.match_faq(message) for message in messages]
+        index_ms = (time.perf_counter() - start) * 1000 / len(messages)
+
+        assert matched[:len(expected)] == expected, "index and scan disagree"
+        print(f"{rows:>8}{scan_ms:>16.2f}{index_ms:>16.4f}{build_ms:>12.0f}{scan_ms / index_ms:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark for the hot-path lookup indexes on the progress table.
+
+Fills a scratch SQLite database with progress rows, then times the lookups the
+routes perform with and without the composite index declared on Progress.
+
+Usage: python benchmark_indexes.py [--rows 1000000] [--lookups 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+from models import Progress
+
+INDEX_NAME = 'uq_progress_user_course_module'
+MODULES_PER_COURSE = 20
+COURSES = 50
+
+
+def populate(engine, rows):
+    """Insert `rows` unique (user, course, module) progress rows."""
+    Progress.__table__.create(engine)
+    per_user = COURSES * MODULES_PER_COURSE
+    users = rows // per_user + 1
+    with engine.begin() as conn:
+        batch = []
+        count = 0
+        for user_id in range(1, users + 1):
+            for course_id in range(1, COURSES + 1):
+                for m in range(MODULES_PER_COURSE):
+                    if count >= rows:
+                        break
+                    batch.append({
+                        'user_id': user_id,
+                        'course_id': course_id,
+                        'module_id': course_id * 100 + m,
+                        'completion': 1.0,
+                    })
+                    count += 1
+                if len(batch) >= 50000:
+                    conn.execute(Progress.__table__.insert(), batch)
+                    batch = []
+        if batch:
+            conn.execute(Progress.__table__.insert(), batch)
+    return users
+
+
+def time_lookups(engine, users, lookups):
+    """Return mean microseconds for the two progress lookups used by the routes."""
+    rng = random.Random(42)
+    by_module = text(
+        'SELECT id FROM progress WHERE user_id = :u AND course_id = :c AND module_id = :m'
+    )
+    by_course = text(
+        'SELECT COUNT(*) FROM progress WHERE user_id = :u AND course_id = :c AND completion >= 1.0'
+    )
+    results = {}
+    with engine.connect() as conn:
+        for label, statement in (('progress by module', by_module), ('progress by course', by_course)):
+            start = time.perf_counter()
+            for _ in range(lookups):
+                course_id = rng.randint(1, COURSES)
+                conn.execute(statement, {
+                    'u': rng.randint(1, users),
+                    'c': course_id,
+                    'm': course_id * 100 + rng.randrange(MODULES_PER_COURSE),
+                }).fetchall()
+            results[label] = (time.perf_counter() - start) / lookups * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000, help='progress rows to insert')
+    parser.add_argument('--lookups', type=int, default=2000, help='lookups per measurement')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        print(f"Inserting {args.rows} progress rows...")
+        users = populate(engine, args.rows)
+
+        with engine.begin() as conn:
+            conn.execute(text(f'DROP INDEX {INDEX_NAME}'))
+        # Fewer lookups without the index: each one is a full table scan
+        before = time_lookups(engine, users, max(1, args.lookups // 20))
+
+        with engine.begin() as conn:
+            conn.execute(text(
+                f'CREATE UNIQUE INDEX {INDEX_NAME} ON progress (user_id, course_id, module_id)'
+            ))
+        after = time_lookups(engine, users, args.lookups)
+
+    print(f"{'lookup':<22}{'no index (us)':>16}{'indexed (us)':>16}{'speedup':>10}")
+    for label in before:
+        print(f"{label:<22}{before[label]:>16.1f}{after[label]:>16.1f}{before[label] / after[label]:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
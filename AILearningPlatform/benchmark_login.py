@@ -0,0 +1,96 @@
+"""
+Benchmark for login throughput.
+
+Fires concurrent POST /login requests while another thread keeps loading a
+cheap page, once with password hashing on the request thread and once on
+the passwords process pool. Reports logins per second and the page's median
+and 95th percentile latency during the burst.
+
+Usage: python benchmark_login.py [--logins 64] [--threads 8] [--workers 4]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import passwords
+from app import create_app
+
+
+def measure(app, logins, threads):
+    page_latencies = []
+    done = threading.Event()
+
+    def browse():
+        client = app.test_client()
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get('/courses')
+            page_latencies.append(time.perf_counter() - start)
+
+    def log_in(_):
+        client = app.test_client()
+        response = client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        return response.status_code
+
+    # The first login creates the user's streak row; do it outside the burst
+    log_in(None)
+    browser = threading.Thread(target=browse)
+    browser.start()
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            statuses = list(pool.map(log_in, range(logins)))
+        elapsed = time.perf_counter() - start
+    finally:
+        done.set()
+        browser.join()
+
+    assert all(status == 302 for status in statuses), f"unexpected login responses: {set(statuses)}"
+    page_latencies.sort()
+    return {
+        'per_second': logins / elapsed,
+        'page_median_ms': statistics.median(page_latencies) * 1000,
+        'page_p95_ms': page_latencies[int(len(page_latencies) * 0.95)] * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--logins', type=int, default=64, help='login requests per measurement')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent login requests')
+    parser.add_argument('--workers', type=int, default=passwords.PASSWORD_HASH_WORKERS or 4,
+                        help='hashing processes for the pooled run')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'benchmark.db')}",
+            'WTF_CSRF_ENABLED': False,
+            'RATELIMIT_ENABLED': False,
+        })
+
+        print(f"{'hashing':<24}{'logins/s':>10}{'page p50 (ms)':>16}{'page p95 (ms)':>16}")
+        for label, hasher in (
+            ('request thread', passwords.PasswordHasher(workers=0, max_pending=args.logins)),
+            (f'pool ({args.workers} processes)', passwords.PasswordHasher(workers=args.workers, max_pending=args.logins)),
+        ):
+            passwords.password_hasher = hasher
+            result = measure(app, args.logins, args.threads)
+            hasher.shutdown()
+            print(f"{label:<24}{result['per_second']:>10.1f}"
+                  f"{result['page_median_ms']:>16.1f}{result['page_p95_ms']:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Bulk certificate renderer for cohort completions.
+
+Finds every completed (user, course) pair whose certificate image has not
+been rendered, creates missing Certificate rows, and renders the images
+into content-addressed storage across a process pool. Each finished render
+is appended to a JSON-lines manifest, so an interrupted run skips the work
+already done when it is started again.
+
+The rows always get URLs under the served CERTIFICATE_DIR. With --output-dir
+the files are written elsewhere and are not served until that directory is
+copied, synced or mounted at CERTIFICATE_DIR.
+
+Usage: python bulk_certificates.py [--workers N] [--manifest PATH]
+                                   [--output-dir DIR] [--limit N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import or_, update
+
+from extensions import db
+from models import User, Course, Enrollment, Certificate, QuizAttempt
+import certificate_storage
+from certificate_generator import render_certificate
+from leaderboard import completion_fraction
+
+DEFAULT_MANIFEST = 'bulk_certificates_manifest.jsonl'
+
+
+def create_missing_certificates():
+    """Create Certificate rows for completed enrollments that have none. Requires an app context."""
+    rows = db.session.query(
+        Enrollment.user_id,
+        Enrollment.course_id
+    ).outerjoin(
+        Certificate,
+        (Certificate.user_id == Enrollment.user_id) & (Certificate.course_id == Enrollment.course_id)
+    ).filter(
+        # Completion is stored as 100 by the quiz and as a 1.0 fraction by progress updates
+        or_(Enrollment.completed_at.isnot(None), completion_fraction(Enrollment.completion) >= 1.0),
+        Certificate.id.is_(None)
+    ).all()
+    if not rows:
+        return 0
+
+    # Latest passing score per pair, in one query
+    pairs = set(rows)
+    scores = {}
+    attempts = QuizAttempt.query.filter(
+        QuizAttempt.user_id.in_({user_id for user_id, _ in pairs}),
+        QuizAttempt.passed.is_(True)
+    ).order_by(QuizAttempt.id).all()
+    for attempt in attempts:
+        scores[(attempt.user_id, attempt.course_id)] = attempt.score
+
+    created = 0
+    for user_id, course_id in pairs:
+        if (user_id, course_id) not in scores:
+            continue
+        db.session.add(Certificate(
+            user_id=user_id,
+            course_id=course_id,
+            issue_date=datetime.utcnow(),
+            verification_code=str(uuid.uuid4()),
+            score=scores[(user_id, course_id)]
+        ))
+        created += 1
+    db.session.commit()
+    return created
+
+
+def find_pending(root, done_codes=frozenset()):
+    """Return render jobs for certificates without a stored image. Requires an app context."""
+    rows = db.session.query(
+        Certificate.id,
+        Certificate.verification_code,
+        Certificate.issue_date,
+        Certificate.certificate_url,
+        Certificate.pdf_url,
+        User.username,
+        Course.title
+    ).join(
+        User, Certificate.user_id == User.id
+    ).join(
+        Course, Certificate.course_id == Course.id
+    ).filter(
+        Certificate.verification_code.isnot(None)
+    ).order_by(
+        Certificate.id
+    ).all()
+
+    jobs = []
+    for certificate_id, code, issue_date, certificate_url, pdf_url, username, course_title in rows:
+        rendered = all(
+            certificate_storage.is_stored(certificate_storage.name_from_url(url), root)
+            for url in (certificate_url, pdf_url)
+        )
+        if code in done_codes or rendered:
+            continue
+        jobs.append({
+            'certificate_id': certificate_id,
+            'verification_code': code,
+            'student_name': username,
+            'course_name': course_title,
+            'date': issue_date.strftime("%B %d, %Y"),
+            'root': root
+        })
+    return jobs
+
+
+def render_job(job):
+    """Render and store one certificate in every format. Runs in a worker process."""
+    outputs = render_certificate(job['student_name'], job['course_name'], job['verification_code'], job['date'])
+    job['stored_names'] = {
+        extension: certificate_storage.store(data, extension, root=job['root'])
+        for extension, data in outputs.items()
+    }
+    return job
+
+
+def load_manifest(path):
+    """Return {verification_code: entry} for the renders already recorded."""
+    if not os.path.exists(path):
+        return {}
+    done = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                entry['stored_names']['pdf']
+                done[entry['verification_code']] = entry
+            except (ValueError, KeyError, TypeError):
+                # A line cut short by an interrupted run; that job is simply redone
+                continue
+    return done
+
+
+def open_manifest(path):
+    """Open the manifest for appending, terminating any line left partial by an interrupted run."""
+    manifest = open(path, 'a+')
+    if manifest.tell() > 0:
+        manifest.seek(manifest.tell() - 1)
+        if manifest.read(1) != '\n':
+            manifest.write('\n')
+    return manifest
+
+
+def record_urls(jobs):
+    """Point the Certificate rows at their rendered files. Requires an app context."""
+    rendered_at = datetime.utcnow()
+    db.session.execute(update(Certificate), [{
+        'id': job['certificate_id'],
+        'certificate_url': certificate_storage.url_for_name(job['stored_names']['jpg']),
+        'pdf_url': certificate_storage.url_for_name(job['stored_names']['pdf']),
+        'rendered_at': rendered_at
+    } for job in jobs])
+    db.session.commit()
+
+
+def run(app, workers=None, manifest_path=DEFAULT_MANIFEST, output_dir=None, limit=None, batch_size=100):
+    """Render all pending certificates and return a summary dict.
+
+    Files go to output_dir (default CERTIFICATE_DIR), but the recorded URLs
+    always point at the served CERTIFICATE_DIR.
+    """
+    output_dir = output_dir or certificate_storage.CERTIFICATE_DIR
+    done = load_manifest(manifest_path)
+
+    with app.app_context():
+        # An interrupted run may have rendered files it never recorded on the rows
+        if done:
+            record_urls(list(done.values()))
+        created = create_missing_certificates()
+        jobs = find_pending(output_dir, done.keys())
+    if limit is not None:
+        jobs = jobs[:limit]
+
+    start = time.perf_counter()
+    rendered = []
+    failed = 0
+    with open_manifest(manifest_path) as manifest, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_job, job) for job in jobs]
+        for future in as_completed(futures):
+            try:
+                job = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Error rendering certificate: {e}")
+                continue
+            manifest.write(json.dumps({
+                'certificate_id': job['certificate_id'],
+                'verification_code': job['verification_code'],
+                'stored_names': job['stored_names']
+            }) + '\n')
+            manifest.flush()
+            rendered.append(job)
+            if len(rendered) % batch_size == 0:
+                with app.app_context():
+                    record_urls(rendered[-batch_size:])
+    elapsed = time.perf_counter() - start
+
+    remainder = len(rendered) % batch_size
+    if remainder:
+        with app.app_context():
+            record_urls(rendered[-remainder:])
+
+    return {
+        'created': created,
+        'skipped': len(done),
+        'rendered': len(rendered),
+        'failed': failed,
+        'seconds': elapsed,
+        'per_second': len(rendered) / elapsed if elapsed > 0 else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='render processes')
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST, help='JSON-lines file of finished renders')
+    parser.add_argument('--output-dir', default=None, help='where to write certificate files; the recorded URLs still '
+                             'point at the served certificate directory')
+    parser.add_argument('--limit', type=int, default=None, help='render at most this many certificates')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    summary = run(app, args.workers, args.manifest, args.output_dir, args.limit)
+    print(f"Created {summary['created']} certificate records, "
+          f"skipped {summary['skipped']} already in the manifest")
+    print(f"Rendered {summary['rendered']} certificates ({summary['failed']} failed) "
+          f"in {summary['seconds']:.1f}s with {args.workers} workers: "
+          f"{summary['per_second']:.1f} certificates/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Course catalog and content snapshots for the e-learning platform.
+
+The catalog (courses plus their module and quiz counts) and each course's compiled
+content (modules with decoded quizzes) only change when an admin edits
+content, so they are built once and kept in memory until a Course, Module
+or Quiz write commits. Per-user data such as enrollment flags is overlaid
+on copies of the shared entries.
+"""
+import json
+import logging
+import threading
+import time
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import object_session
+
+from extensions import db
+from models import Course, Module, Quiz, Enrollment
+
+# Content edits made through another worker process are picked up after this
+CATALOG_TTL_SECONDS = 300
+
+SESSION_CHANGED_KEY = 'catalog_changed'
+
+# (built_at, entries), swapped atomically
+_cache = None
+_lock = threading.Lock()
+
+# Bumped whenever a content write commits; compiled course content built
+# under an older version is discarded on its next lookup
+_content_version = 0
+# course_id -> (content_version, built_at, content)
+_course_content = {}
+
+
+def build_catalog():
+    """Load every course with its module and quiz counts in a single query."""
+    rows = db.session.query(
+        Course, func.count(func.distinct(Module.id)), func.count(Quiz.id)
+    ).outerjoin(
+        Module, Module.course_id == Course.id
+    ).outerjoin(
+        Quiz, Quiz.module_id == Module.id
+    ).group_by(
+        Course.id
+    ).order_by(
+        Course.id
+    ).all()
+
+    return tuple({
+        'id': course.id,
+        'title': course.title,
+        'description': course.description,
+        'image_url': course.image_url,
+        'instructor': course.instructor,
+        'duration': course.duration,
+        'level': course.level,
+        'module_count': module_count,
+        'quiz_count': quiz_count
+    } for course, module_count, quiz_count in rows)
+
+
+def get_catalog():
+    """Return the shared catalog entries. Callers must not mutate them."""
+    global _cache
+    cache = _cache
+    if cache is not None and time.monotonic() - cache[0] <= CATALOG_TTL_SECONDS:
+        return cache[1]
+
+    with _lock:
+        if _cache is None or time.monotonic() - _cache[0] > CATALOG_TTL_SECONDS:
+            entries = build_catalog()
+            _cache = (time.monotonic(), entries)
+            logging.debug(f"Course catalog snapshot built with {len(entries)} courses")
+        return _cache[1]
+
+
+def get_course_by_title(title):
+    """Return the shared catalog entry for a course title, or None."""
+    return next((course for course in get_catalog() if course['title'] == title), None)
+
+
+def get_featured_courses(limit=3):
+    return list(get_catalog()[:limit])
+
+
+def get_catalog_for_user(user_id=None):
+    """Return catalog entries with an 'enrolled' flag for the given user.
+
+    Anonymous visitors (user_id=None) are served without touching the database.
+    """
+    enrolled_course_ids = set()
+    if user_id is not None:
+        enrolled_course_ids = {
+            course_id for (course_id,) in db.session.query(
+                Enrollment.course_id
+            ).filter(
+                Enrollment.user_id == user_id
+            ).all()
+        }
+    return [dict(course, enrolled=course['id'] in enrolled_course_ids) for course in get_catalog()]
+
+
+def build_course_content(course_id):
+    """Compile a course's modules and quizzes into template-ready data.
+
+    Uses three queries regardless of module count. Returns None if the
+    course does not exist.
+    """
+    course = db.session.get(Course, course_id)
+    if course is None:
+        return None
+
+    modules = Module.query.filter_by(course_id=course_id).order_by(Module.order).all()
+    quizzes_by_module = {module.id: [] for module in modules}
+    if modules:
+        quizzes = Quiz.query.filter(
+            Quiz.module_id.in_(quizzes_by_module.keys())
+        ).order_by(Quiz.id).all()
+        for quiz in quizzes:
+            quizzes_by_module[quiz.module_id].append({
+                'id': quiz.id,
+                'question': quiz.question,
+                'options': json.loads(quiz._options),
+                'answer': quiz.answer
+            })
+
+    return {
+        'id': course.id,
+        'title': course.title,
+        'description': course.description,
+        'image_url': course.image_url,
+        'instructor': course.instructor,
+        'duration': course.duration,
+        'level': course.level,
+        'modules': [{
+            'id': module.id,
+            'title': module.title,
+            'content': module.content,
+            'video_url': module.video_url,
+            'quiz': quizzes_by_module[module.id]
+        } for module in modules]
+    }
+
+
+def get_course_content(course_id):
+    """Return the shared compiled content for a course, or None if it does not exist.
+
+    The result is shared across requests and users; callers must not mutate it.
+    """
+    version = _content_version
+    cached = _course_content.get(course_id)
+    if cached is not None and cached[0] == version and time.monotonic() - cached[1] <= CATALOG_TTL_SECONDS:
+        return cached[2]
+
+    # Unknown ids are rejected from the catalog without another query
+    if not any(course['id'] == course_id for course in get_catalog()):
+        return None
+
+    content = build_course_content(course_id)
+    if content is not None:
+        _course_content[course_id] = (version, time.monotonic(), content)
+    return content
+
+
+def invalidate_catalog():
+    """Drop the catalog and all compiled course content."""
+    global _cache, _content_version
+    _content_version += 1
+    _cache = None
+    _course_content.clear()
+
+
+# Invalidate only once a content change has actually been committed
+def _track_content_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info[SESSION_CHANGED_KEY] = True
+
+
+for _model in (Course, Module, Quiz):
+    for _operation in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _operation, _track_content_change)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop(SESSION_CHANGED_KEY, False):
+        invalidate_catalog()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop(SESSION_CHANGED_KEY, None)
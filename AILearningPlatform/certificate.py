@@ -3,12 +3,13 @@ Certificate Blueprint
 
 This module handles all certificate-related routes and functionality.
 """
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_file, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_file, abort, jsonify
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from models import Certificate, Course, User
-from extensions import db
-import os
+from extensions import db, csrf, limiter
+from certificate_jobs import request_certificate
+from verification import verify_code, verify_codes, MAX_BATCH_CODES
 from datetime import datetime
 
 # Create blueprint
@@ -53,16 +54,11 @@ def download_certificate(certificate_id):
         if current_user.id != certificate.user_id and not current_user.is_admin:
             abort(403)
         
-        # Check if the certificate file exists
-        if not certificate.certificate_url or not os.path.exists(certificate.certificate_url):
-            # Try to regenerate the certificate
-            if not certificate.generate_pdf():
-                flash('Certificate file not found and could not be regenerated.', 'error')
-                return redirect(url_for('certificate.my_certificates'))
-        
-        # Get the directory and filename from the certificate URL
-        directory = os.path.dirname(certificate.certificate_url)
-        filename = os.path.basename(certificate.certificate_url)
+        # Renders happen in the background; never inside this request
+        if not certificate.is_rendered:
+            request_certificate(current_app._get_current_object(), certificate.user, certificate.course, certificate)
+            flash('Your certificate is being prepared. Please try again in a moment.', 'info')
+            return redirect(url_for('certificate.my_certificates'))
         
         # Create a nice filename for download
         course_title = certificate.course.title.replace(' ', '_')
@@ -70,7 +66,7 @@ def download_certificate(certificate_id):
         
         # Serve the file for download
         return send_file(
-            os.path.join(current_app.root_path, 'static', directory, filename),
+            certificate.pdf_path,
             as_attachment=True,
             download_name=download_filename,
             mimetype='application/pdf'
@@ -80,6 +76,20 @@ def download_certificate(certificate_id):
         flash('An error occurred while downloading the certificate. Please try again later.', 'error')
         return redirect(url_for('certificate.my_certificates'))
 
+def queue_render(certificate):
+    """Queue a background render for a certificate whose files are missing."""
+    try:
+        request_certificate(current_app._get_current_object(), certificate.user, certificate.course, certificate)
+    except Exception as e:
+        current_app.logger.error(f"Error queueing certificate render: {e}")
+
+def lookup_certificate(code):
+    """Verification result for a code, queueing a render if its files are missing."""
+    result = verify_code(code)
+    if result is not None and not result['is_rendered']:
+        queue_render(db.session.get(Certificate, result['id']))
+    return result
+
 @cert_bp.route('/verify', methods=['GET'])
 def verify():
     """Verify a certificate using a verification code."""
@@ -89,8 +99,8 @@ def verify():
         return render_template('certificates/verify.html', certificate=None)
     
     try:
-        # Find certificate by verification code
-        certificate = Certificate.query.filter_by(verification_code=code).first()
+        # Unknown codes are rejected by the verification filter without a query
+        certificate = lookup_certificate(code)
         
         if not certificate:
             return render_template(
@@ -99,18 +109,6 @@ def verify():
                 error='Invalid verification code. Please check and try again.'
             )
         
-        # If certificate URL doesn't exist, generate the PDF
-        if not certificate.certificate_url or not os.path.exists(certificate.certificate_url):
-            try:
-                certificate.generate_pdf()
-            except Exception as e:
-                current_app.logger.error(f"Error generating certificate PDF: {e}")
-                return render_template(
-                    'certificates/verify.html',
-                    certificate=None,
-                    error='Error generating certificate. Please contact support.'
-                )
-        
         return render_template(
             'certificates/verify.html', 
             certificate=certificate,
@@ -125,6 +123,39 @@ def verify():
             error='An error occurred while verifying the certificate. Please try again later.'
         ), 500
 
+@cert_bp.route('/api/verify', methods=['POST'])
+@csrf.exempt
+@limiter.limit("30 per minute")
+def verify_batch():
+    """Verify many certificate codes in one request (e.g. for employers).
+
+    Expects JSON {"codes": [...]} and returns {"results": {code: {...}}}.
+    """
+    data = request.get_json(silent=True) or {}
+    codes = data.get('codes')
+    if not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+        return jsonify({'error': 'Expected a JSON list of codes'}), 400
+    if len(codes) > MAX_BATCH_CODES:
+        return jsonify({'error': f'At most {MAX_BATCH_CODES} codes per request'}), 400
+    
+    try:
+        results = {}
+        for code, certificate in verify_codes(codes).items():
+            if certificate is None:
+                results[code] = {'valid': False}
+                continue
+            results[code] = {
+                'valid': True,
+                'student': certificate['user']['username'],
+                'course': certificate['course']['title'],
+                'score': certificate['score'],
+                'issue_date': certificate['issue_date'].isoformat() if certificate['issue_date'] else None
+            }
+        return jsonify({'results': results})
+    except Exception as e:
+        current_app.logger.error(f"Error during batch certificate verification: {e}")
+        return jsonify({'error': 'An error occurred while verifying the certificates'}), 500
+
 # Error handlers for certificate routes
 @cert_bp.app_errorhandler(403)
 def forbidden_error(error):
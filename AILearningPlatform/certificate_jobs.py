@@ -0,0 +1,127 @@
+"""
+Background rendering of certificates.
+
+Rendering a certificate (a 2000x1414 image, JPEG-encoded and wrapped in a
+PDF) takes long enough that it should not happen inside a request. Jobs are
+queued on a small local thread pool, keyed by (user_id, course_id) so that
+repeated submissions for the same certificate share one job. Pages poll the
+job status until the files are ready.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from extensions import db
+from models import Certificate
+from certificate_generator import render_certificate
+import certificate_storage
+
+CERTIFICATE_WORKERS = int(os.environ.get("CERTIFICATE_WORKERS", 2))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class CertificateJob:
+    def __init__(self, user_id, course_id, student_name, course_name, verification_code, date):
+        self.user_id = user_id
+        self.course_id = course_id
+        self.student_name = student_name
+        self.course_name = course_name
+        self.verification_code = verification_code
+        self.date = date
+        self.status = QUEUED
+        self.error = None
+        self.future = None
+        # {'jpg': name, 'pdf': name} in certificate storage, once READY
+        self.stored_names = None
+
+
+class CertificateJobQueue:
+    """Idempotent queue of certificate renders backed by a thread pool.
+
+    Submitting a (user_id, course_id) pair that is already queued, running or
+    rendered returns the existing job. Failed jobs, and rendered ones whose
+    file has since gone missing, are submitted again.
+    """
+
+    def __init__(self, max_workers=CERTIFICATE_WORKERS):
+        self.max_workers = max_workers
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def submit(self, app, user_id, course_id, student_name, course_name, verification_code, date):
+        key = (user_id, course_id)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.verification_code == verification_code:
+                if job.status in (QUEUED, RUNNING):
+                    return job
+                if job.status == READY and all(certificate_storage.is_stored(name) for name in job.stored_names.values()):
+                    return job
+            job = self._jobs[key] = CertificateJob(user_id, course_id, student_name, course_name, verification_code, date)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='certificate')
+            job.future = self._executor.submit(self._render, app, job)
+        return job
+
+    def get(self, user_id, course_id):
+        with self._lock:
+            return self._jobs.get((user_id, course_id))
+
+    def _render(self, app, job):
+        job.status = RUNNING
+        try:
+            outputs = render_certificate(job.student_name, job.course_name, job.verification_code, job.date)
+            stored_names = {
+                extension: certificate_storage.store(data, extension)
+                for extension, data in outputs.items()
+            }
+
+            with app.app_context():
+                certificate = Certificate.query.filter_by(
+                    user_id=job.user_id,
+                    course_id=job.course_id
+                ).first()
+                if certificate is not None:
+                    certificate.record_renders(stored_names)
+                    db.session.commit()
+            job.stored_names = stored_names
+            job.status = READY
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+            logging.error(f"Error rendering certificate for user {job.user_id}, course {job.course_id}: {e}")
+
+    def wait(self, timeout=None):
+        """Block until every submitted job has finished (used by tests and shutdown)."""
+        with self._lock:
+            futures = [job.future for job in self._jobs.values() if job.future is not None]
+        for future in futures:
+            future.result(timeout)
+
+    def clear(self):
+        with self._lock:
+            self._jobs.clear()
+
+
+certificate_jobs = CertificateJobQueue()
+
+
+def request_certificate(app, user, course, certificate):
+    """Make sure the certificate file exists or is being rendered.
+
+    Returns (status, job); status is READY when the certificate's JPEG and
+    PDF are already in storage.
+    """
+    if certificate.is_rendered:
+        return READY, None
+    job = certificate_jobs.submit(
+        app, user.id, course.id, user.username, course.title, certificate.verification_code,
+        certificate.issue_date.strftime("%B %d, %Y")
+    )
+    return job.status, job
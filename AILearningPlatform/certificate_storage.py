@@ -0,0 +1,76 @@
+"""
+Content-addressed storage for rendered certificates.
+
+Each file is named by the SHA-256 of its bytes and sharded into two levels
+of subdirectories (ab/cd/abcd....jpg), so a stored file never changes and
+can be cached forever, and no single directory grows without bound.
+Certificate.certificate_url holds the path relative to static/, e.g.
+"generated_certificates/ab/cd/abcd....jpg".
+"""
+import hashlib
+import os
+import re
+import threading
+
+CERTIFICATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'generated_certificates')
+URL_PREFIX = 'generated_certificates/'
+
+_NAME_PATTERN = re.compile(r'^([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})\.(jpg|pdf)$')
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def stored_name(key, extension='jpg'):
+    """Sharded relative name for a content key."""
+    return f"{key[:2]}/{key[2:4]}/{key}.{extension}"
+
+
+def parse_name(name):
+    """Return the content key of a stored name, or None if it is not one."""
+    match = _NAME_PATTERN.match(name or '')
+    if not match or match.group(1) != match.group(3)[:2] or match.group(2) != match.group(3)[2:4]:
+        return None
+    return match.group(3)
+
+
+def stored_path(name, root=None):
+    return os.path.join(root or CERTIFICATE_DIR, *name.split('/'))
+
+
+def is_stored(name, root=None):
+    return parse_name(name) is not None and os.path.exists(stored_path(name, root))
+
+
+def store(data, extension='jpg', root=None):
+    """Write data under its content hash and return the stored name.
+
+    Storing the same bytes twice is a no-op, and the write is atomic, so
+    readers never see a partial file.
+    """
+    name = stored_name(content_key(data), extension)
+    path = stored_path(name, root)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    return name
+
+
+def mimetype_for(name):
+    return 'application/pdf' if name.endswith('.pdf') else 'image/jpeg'
+
+
+def url_for_name(name):
+    return URL_PREFIX + name
+
+
+def name_from_url(certificate_url):
+    """Return the stored name for a Certificate.certificate_url, or None for legacy URLs."""
+    if not certificate_url or not certificate_url.startswith(URL_PREFIX):
+        return None
+    name = certificate_url[len(URL_PREFIX):]
+    return name if parse_name(name) else None
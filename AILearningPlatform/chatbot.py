@@ -3,11 +3,19 @@ Chatbot module for the e-learning platform.
 Integrates with OpenAI to answer course-related questions.
 If no API key is provided, falls back to predefined responses.
 """
+import atexit
 import os
 import logging
 import random
 import datetime
+import re
+import threading
+import time
+from collections import OrderedDict
 import pandas as pd
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
 from extensions import db
 from models import ChatMessage
 
@@ -15,25 +23,80 @@ from models import ChatMessage
 # AILearningPlatform/data/faq.csv
 FAQ_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'faq.csv')
 faq_data = None
+# (inverted index of keyword -> positions of the FAQ rows listing it, answers by position),
+# replaced as one tuple so readers never see an index and answers from different loads
+faq_lookup = ({}, [])
+# Modification time of the CSV the index was built from, and throttling for re-checks
+faq_mtime = None
+FAQ_RELOAD_CHECK_SECONDS = 5
+_faq_last_checked = 0.0
+_faq_lock = threading.Lock()
+
+def build_faq_index(data):
+    """Build the keyword -> row positions index and the answers list for a FAQ DataFrame."""
+    index = {}
+    for position, keywords in enumerate(data['Keywords']):
+        for keyword in set(keywords):
+            index.setdefault(keyword, []).append(position)
+    return index, data['Answer'].tolist()
 
 def load_faq_data():
-    """Loads FAQ data from a CSV file into a pandas DataFrame."""
-    global faq_data
+    """Loads FAQ data from a CSV file into a pandas DataFrame and indexes its keywords."""
+    global faq_data, faq_lookup, faq_mtime
     try:
-        faq_data = pd.read_csv(FAQ_CSV_PATH)
+        mtime = os.path.getmtime(FAQ_CSV_PATH)
+        data = pd.read_csv(FAQ_CSV_PATH)
         # Convert keywords to lowercase and into a list of strings for easier matching
-        if 'Keywords' in faq_data.columns:
-            faq_data['Keywords'] = faq_data['Keywords'].fillna('').astype(str).str.lower().apply(lambda x: [kw.strip() for kw in x.split(',') if kw.strip()])
+        if 'Keywords' in data.columns:
+            data['Keywords'] = data['Keywords'].fillna('').astype(str).str.lower().apply(lambda x: [kw.strip() for kw in x.split(',') if kw.strip()])
         else:
             logging.warning(f"'Keywords' column not found in {FAQ_CSV_PATH}. FAQ keyword matching will be limited.")
-            faq_data['Keywords'] = [[] for _ in range(len(faq_data))] # Add empty list if no keywords column
-        logging.info(f"FAQ data loaded successfully from {FAQ_CSV_PATH}. Rows: {len(faq_data)}")
+            data['Keywords'] = [[] for _ in range(len(data))] # Add empty list if no keywords column
+        lookup = build_faq_index(data)
+        # Swap in the new data only once it is fully built
+        faq_data, faq_lookup, faq_mtime = data, lookup, mtime
+        logging.info(f"FAQ data loaded successfully from {FAQ_CSV_PATH}. Rows: {len(faq_data)}, keywords: {len(lookup[0])}")
     except FileNotFoundError:
         logging.warning(f"FAQ CSV file not found at {FAQ_CSV_PATH}. Chatbot will rely on generic fallbacks.")
-        faq_data = None # Ensure it's None if file not found
+        faq_data, faq_lookup, faq_mtime = None, ({}, []), None # Ensure it's None if file not found
     except Exception as e:
         logging.error(f"Error loading FAQ CSV from {FAQ_CSV_PATH}: {e}")
-        faq_data = None
+        faq_data, faq_lookup, faq_mtime = None, ({}, []), None
+
+def reload_faq_if_changed():
+    """Reload the FAQ when the CSV on disk has changed, checking at most every few seconds."""
+    global _faq_last_checked
+    now = time.monotonic()
+    if now - _faq_last_checked < FAQ_RELOAD_CHECK_SECONDS:
+        return
+    with _faq_lock:
+        if now - _faq_last_checked < FAQ_RELOAD_CHECK_SECONDS:
+            return
+        _faq_last_checked = now
+        try:
+            mtime = os.path.getmtime(FAQ_CSV_PATH)
+        except OSError:
+            mtime = None
+        if mtime != faq_mtime:
+            load_faq_data()
+
+def match_faq(user_message_lower):
+    """Return the answer of the FAQ row sharing the most keywords with the message, or None.
+
+    Only rows that share at least one keyword are scored; ties go to the earliest row.
+    """
+    index, answers = faq_lookup
+    scores = {}
+    for keyword in set(user_message_lower.split()):
+        for position in index.get(keyword, ()):
+            scores[position] = scores.get(position, 0) + 1
+    if not scores:
+        return None
+    best_position = min(scores, key=lambda position: (-scores[position], position))
+    best_response = answers[best_position]
+    if not isinstance(best_response, str) or not best_response:
+        return None
+    return best_response
 
 # Load FAQ data when the module is imported
 load_faq_data()
@@ -54,10 +117,233 @@ Keep your responses concise but thorough, focusing on accuracy and educational v
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 has_api_key = OPENAI_API_KEY is not None and OPENAI_API_KEY != "your-api-key"
 
+# Upstream limits: a slow model must not hold a web worker indefinitely
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+LLM_CONNECT_TIMEOUT = float(os.environ.get("OPENAI_CONNECT_TIMEOUT", 5))
+LLM_READ_TIMEOUT = float(os.environ.get("OPENAI_READ_TIMEOUT", 30))
+LLM_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", 1))
+# The newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+# do not change this unless explicitly requested by the user
+LLM_MODEL = "gpt-4o"
+
+
+class CircuitOpenError(Exception):
+    """Raised when the LLM circuit breaker is rejecting calls."""
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream errors.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    rejects calls for `reset_timeout` seconds. It then lets a single trial
+    call through (half-open). Success closes it again and failure reopens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release(self):
+        """End a call that was abandoned before its outcome was known, leaving the state as it was."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def reset(self):
+        self.record_success()
+
+
+llm_breaker = CircuitBreaker()
+client = None
+
+# Model answers to common questions are reused across users for a while
+CHAT_CACHE_MAX_ENTRIES = int(os.environ.get("CHAT_CACHE_MAX_ENTRIES", 1000))
+CHAT_CACHE_TTL_SECONDS = float(os.environ.get("CHAT_CACHE_TTL_SECONDS", 3600))
+
+
+def normalize_message(message):
+    """Lowercase, drop punctuation and collapse whitespace so trivially different phrasings share a key."""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', message.lower()).split())
+
+
+def response_cache_key(user_message, course_context=None):
+    return (normalize_message(user_message), course_context['title'] if course_context else None)
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ResponseCache:
+    """LRU + TTL cache of chatbot answers with single-flight computation.
+
+    Concurrent misses for the same key wait for the first caller's upstream
+    call instead of issuing their own.
+    """
+
+    def __init__(self, max_entries=CHAT_CACHE_MAX_ENTRIES, ttl=CHAT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key):
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def join(self, key):
+        """Return (value, flight, leader) for key.
+
+        value is the cached answer, if any. Otherwise flight is the in-flight
+        computation, which the caller must finish() if leader is True and
+        otherwise wait() for.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value, None, False
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _InFlight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+            return None, flight, leader
+
+    def wait(self, flight):
+        """Block until the leader finishes; return its result or raise its error."""
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def finish(self, key, flight, result=None, error=None):
+        """Publish the leader's result (cached) or error to the waiting callers."""
+        if error is None:
+            flight.result = result
+            self.set(key, result)
+        else:
+            flight.error = error
+        with self._lock:
+            self._in_flight.pop(key, None)
+        flight.done.set()
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, or compute it exactly once across concurrent callers."""
+        value, flight, leader = self.join(key)
+        if value is not None:
+            return value
+        if not leader:
+            return self.wait(flight)
+
+        try:
+            result = compute()
+        except Exception as e:
+            self.finish(key, flight, error=e)
+            raise
+        self.finish(key, flight, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'size': len(self._entries)
+            }
+
+
+response_cache = ResponseCache()
+
+
+def create_llm_client(api_key=None, base_url=None):
+    """Create the shared OpenAI client with connect/read timeouts.
+
+    The client keeps a pooled HTTP connection, so it is created once and reused.
+    """
+    from openai import OpenAI, Timeout
+    return OpenAI(
+        api_key=api_key or OPENAI_API_KEY,
+        base_url=base_url or OPENAI_BASE_URL,
+        timeout=Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        max_retries=LLM_MAX_RETRIES,
+    )
+
+
 if has_api_key:
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=OPENAI_API_KEY)
+        client = create_llm_client()
         logging.info("OpenAI client initialized successfully")
     except ImportError:
         has_api_key = False
@@ -66,6 +352,81 @@ if has_api_key:
         has_api_key = False
         logging.error(f"Error initializing OpenAI client: {str(e)}")
 
+
+def build_llm_messages(user_message, course_context=None):
+    """Prepare the chat messages sent to the model."""
+    messages = [
+        {"role": "system", "content": system_prompt}
+    ]
+    
+    # Add course context if available
+    if course_context:
+        course_info = f"""
+        The user is currently studying the course: {course_context['title']}
+        Course level: {course_context['level']}
+        Course description: {course_context['description']}
+        """
+        messages.append({"role": "system", "content": course_info})
+    
+    # Add the user's message
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+def get_llm_response(messages):
+    """Call the model through the shared client, guarded by the circuit breaker.
+
+    Raises CircuitOpenError without contacting the upstream while the breaker
+    is open, and re-raises upstream errors after recording them.
+    """
+    if not llm_breaker.allow():
+        raise CircuitOpenError("LLM circuit breaker is open")
+    try:
+        response = client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+            max_tokens=500,
+            temperature=0.7,
+        )
+    except Exception:
+        llm_breaker.record_failure()
+        raise
+    llm_breaker.record_success()
+    return response.choices[0].message.content
+
+
+def stream_llm_response(messages):
+    """Like get_llm_response() but yields content tokens as the model produces them."""
+    if not llm_breaker.allow():
+        raise CircuitOpenError("LLM circuit breaker is open")
+    try:
+        stream = client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+            max_tokens=500,
+            temperature=0.7,
+            stream=True,
+        )
+    except Exception:
+        llm_breaker.record_failure()
+        raise
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except GeneratorExit:
+        # The consumer went away (e.g. the browser tab closed); not an upstream
+        # failure, but a half-open trial must give its slot back
+        llm_breaker.release()
+        raise
+    except Exception:
+        llm_breaker.record_failure()
+        raise
+    else:
+        llm_breaker.record_success()
+    finally:
+        stream.close()
+
 # Fallback responses for when OpenAI is not available
 fallback_responses = [
     "Python is a high-level, interpreted programming language known for its readability and simplicity. It's great for beginners and also powerful enough for professional applications.",
@@ -95,78 +456,90 @@ def get_chatbot_response(username, user_message, course_context=None):
     # We don't log the message here as it's now handled in the route function
     
     # If OpenAI API is available, use it
-    if has_api_key:
+    if has_api_key and client is not None:
         try:
-            # Prepare the messages for the API
-            from openai.types.chat import ChatCompletionSystemMessageParam, ChatCompletionUserMessageParam
-            from openai import OpenAI
-            
-            messages = [
-                {"role": "system", "content": system_prompt}
-            ]
-            
-            # Add course context if available
-            if course_context:
-                course_info = f"""
-                The user is currently studying the course: {course_context['title']}
-                Course level: {course_context['level']}
-                Course description: {course_context['description']}
-                """
-                messages.append({"role": "system", "content": course_info})
-            
-            # Add the user's message
-            messages.append({"role": "user", "content": user_message})
-            
-            try:
-                # Get response from OpenAI
-                # The newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-                # do not change this unless explicitly requested by the user
-                client = OpenAI(api_key=OPENAI_API_KEY)
-                response = client.chat.completions.create(
-                    model="gpt-4o",  # Using the latest model
-                    messages=messages,
-                    max_tokens=500,
-                    temperature=0.7,
-                )
-            except Exception as e:
-                logging.error(f"Error with OpenAI API: {str(e)}")
-                raise
-            
-            # Extract the response content
-            bot_response = response.choices[0].message.content
-            
-            return bot_response
-        
+            # Identical questions (after normalisation) in the same course context share one answer
+            return response_cache.get_or_compute(
+                response_cache_key(user_message, course_context),
+                lambda: get_llm_response(build_llm_messages(user_message, course_context))
+            )
+        except CircuitOpenError:
+            logging.warning("OpenAI circuit breaker open, using fallback responses")
         except Exception as e:
             logging.error(f"Error getting chatbot response: {str(e)}")
             # Fall through to use fallback responses
     
     # If no API key or there was an error, use fallback responses
+    return get_fallback_response(username, user_message, course_context)
+
+def stream_chatbot_response(username, user_message, course_context=None):
+    """
+    Stream a response from the AI chatbot.
+    
+    Yields the model's tokens as they arrive. Fallback answers are yielded as
+    a single chunk. If the model fails after some tokens were already sent,
+    the stream simply ends there.
+    """
+    if has_api_key and client is not None:
+        # Concurrent identical questions share one upstream stream: the first
+        # caller streams it, the others get the finished answer as one chunk
+        cache_key = response_cache_key(user_message, course_context)
+        cached, flight, leader = response_cache.join(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        if not leader:
+            try:
+                yield response_cache.wait(flight)
+                return
+            except CircuitOpenError:
+                logging.warning("OpenAI circuit breaker open, using fallback responses")
+            except Exception as e:
+                logging.error(f"Error streaming chatbot response: {str(e)}")
+            yield get_fallback_response(username, user_message, course_context)
+            return
+
+        streamed = []
+        answer = None
+        error = None
+        try:
+            for token in stream_llm_response(build_llm_messages(user_message, course_context)):
+                streamed.append(token)
+                yield token
+            answer = ''.join(streamed) or None
+            return
+        except CircuitOpenError as e:
+            error = e
+            logging.warning("OpenAI circuit breaker open, using fallback responses")
+        except Exception as e:
+            error = e
+            logging.error(f"Error streaming chatbot response: {str(e)}")
+            if streamed:
+                return
+        finally:
+            # Only complete answers are cached and shared; waiting callers
+            # fall back if the stream failed or this client went away
+            if answer is not None:
+                response_cache.finish(cache_key, flight, answer)
+            else:
+                response_cache.finish(cache_key, flight, error=error or RuntimeError(
+                    "Streaming ended without a complete answer"))
+    
+    yield get_fallback_response(username, user_message, course_context)
+
+def get_fallback_response(username, user_message, course_context=None):
+    """Answer from the FAQ CSV or the canned fallback responses without calling the model."""
     user_message_lower = user_message.lower()
 
     # 1. Try FAQ CSV Fallback
-    if faq_data is not None and not faq_data.empty:
-        user_keywords = set(user_message_lower.split())
-        best_match_score = 0
-        best_response = None
-
-        for index, row in faq_data.iterrows():
-            if not row['Keywords']: # Skip if no keywords for this FAQ entry
-                continue
-            
-            faq_keywords = set(row['Keywords'])
-            common_keywords = user_keywords.intersection(faq_keywords)
-            
-            if len(common_keywords) > best_match_score:
-                best_match_score = len(common_keywords)
-                best_response = row['Answer']
-        
-        if best_match_score > 0 and best_response: # Require at least one keyword match
-            logging.info(f"Found relevant answer in FAQ CSV for user message: '{user_message}'")
-            # Personalize if it's a greeting
-            if any(greet in user_message_lower for greet in ['hi', 'hello', 'hey']):
-                 return f"Hello {username}! I found this in our FAQ that might help: {best_response}"
-            return best_response
+    reload_faq_if_changed()
+    best_response = match_faq(user_message_lower)
+    if best_response: # Require at least one keyword match
+        logging.info(f"Found relevant answer in FAQ CSV for user message: '{user_message}'")
+        # Personalize if it's a greeting
+        if any(greet in user_message_lower for greet in ['hi', 'hello', 'hey']):
+             return f"Hello {username}! I found this in our FAQ that might help: {best_response}"
+        return best_response
 
     # 2. If no FAQ match, try existing fallback_responses logic
     logging.info("No suitable FAQ match found, trying generic fallbacks.")
@@ -208,3 +581,185 @@ def get_chatbot_response(username, user_message, course_context=None):
         bot_response = f"Regarding the {course_context['title']} course ({course_context['level']} level): {bot_response}"
     
     return bot_response
+
+# Chat persistence. With write-behind enabled, exchanges are buffered in memory
+# and bulk-inserted in batches; the last batch can be lost if the process dies
+# and a reload may briefly not show the newest messages.
+CHAT_WRITE_BEHIND = os.environ.get("CHAT_WRITE_BEHIND", "false").lower() in ['true', 'on', '1']
+CHAT_WRITE_BATCH_SIZE = int(os.environ.get("CHAT_WRITE_BATCH_SIZE", 200))
+CHAT_WRITE_FLUSH_SECONDS = float(os.environ.get("CHAT_WRITE_FLUSH_SECONDS", 1.0))
+# A row the database rejects this many times is dropped; past the cap the oldest rows are dropped
+CHAT_WRITE_MAX_ATTEMPTS = int(os.environ.get("CHAT_WRITE_MAX_ATTEMPTS", 5))
+CHAT_WRITE_MAX_PENDING = int(os.environ.get("CHAT_WRITE_MAX_PENDING", 10000))
+# While the database is unreachable the flush interval doubles up to this
+CHAT_WRITE_MAX_BACKOFF_SECONDS = float(os.environ.get("CHAT_WRITE_MAX_BACKOFF_SECONDS", 30))
+
+# Failures caused by the rows themselves rather than by the database being unavailable
+ROW_ERRORS = (IntegrityError, DataError)
+
+
+def chat_exchange_rows(user_id, user_message, sent_at, bot_response=None, replied_at=None):
+    """ChatMessage rows for one exchange; the reply is omitted if there is none."""
+    rows = [{
+        'user_id': user_id,
+        'message': user_message,
+        'timestamp': sent_at,
+        'is_from_user': True
+    }]
+    if bot_response:
+        rows.append({
+            'user_id': user_id,
+            'message': bot_response,
+            'timestamp': replied_at or sent_at,
+            'is_from_user': False
+        })
+    return rows
+
+
+class ChatWriteBuffer:
+    """Write-behind buffer that bulk-inserts chat messages.
+
+    A background thread flushes every flush_interval seconds, or as soon as
+    batch_size rows are pending, with a single multi-row INSERT. The thread
+    starts with the first buffered row and exits once the buffer is empty.
+    If the batch is rejected (IntegrityError, DataError) its rows are
+    retried one by one, so a bad row cannot hold back the rest, and a row
+    rejected max_attempts times is dropped. Any other failure is treated as
+    the database being unavailable: the rows are kept without counting an
+    attempt and the flush interval backs off, with max_pending as the only
+    bound on what is kept.
+    """
+
+    def __init__(self, batch_size=CHAT_WRITE_BATCH_SIZE, flush_interval=CHAT_WRITE_FLUSH_SECONDS,
+                 max_attempts=CHAT_WRITE_MAX_ATTEMPTS, max_pending=CHAT_WRITE_MAX_PENDING,
+                 max_backoff=CHAT_WRITE_MAX_BACKOFF_SECONDS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        self.dropped = 0
+        # Seconds until the next flush while the database is unavailable
+        self.retry_delay = None
+        # [rejected attempts, row] pairs, oldest first
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._app = None
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    def _trim(self):
+        # Called with the lock held
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            del self._pending[:overflow]
+            self.dropped += overflow
+            logging.error(f"Chat write buffer full, dropped the {overflow} oldest messages")
+
+    def add(self, app, rows):
+        with self._lock:
+            self._app = app
+            self._pending.extend([0, row] for row in rows)
+            self._trim()
+            if len(self._pending) >= self.batch_size and self.retry_delay is None:
+                self._wakeup.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chat-write-behind', daemon=True)
+                self._thread.start()
+
+    def _insert(self, rows):
+        try:
+            db.session.execute(insert(ChatMessage), rows)
+            db.session.commit()
+            return None
+        except Exception as e:
+            db.session.rollback()
+            return e
+
+    def _requeue(self, entries):
+        with self._lock:
+            self._pending[:0] = entries
+            self._trim()
+
+    def _back_off(self, count, error):
+        self.retry_delay = min((self.retry_delay or self.flush_interval) * 2, self.max_backoff)
+        logging.error(f"Database unavailable, keeping {count} chat messages "
+                      f"and retrying in {self.retry_delay:.0f}s: {error}")
+
+    def flush(self):
+        """Insert everything pending now. Returns the number of rows written."""
+        with self._lock:
+            entries, self._pending = self._pending, []
+            app = self._app
+        if not entries:
+            return 0
+        with app.app_context():
+            error = self._insert([row for _, row in entries])
+            if error is None:
+                self.retry_delay = None
+                return len(entries)
+            if not isinstance(error, ROW_ERRORS):
+                self._back_off(len(entries), error)
+                self._requeue(entries)
+                return 0
+            self.retry_delay = None
+            logging.error(f"Error flushing {len(entries)} chat messages, retrying them one by one: {error}")
+
+            written = 0
+            retry = []
+            for index, entry in enumerate(entries):
+                error = self._insert([entry[1]])
+                if error is None:
+                    written += 1
+                    continue
+                if not isinstance(error, ROW_ERRORS):
+                    # The database went away part way through
+                    self._back_off(len(entries) - index, error)
+                    retry.extend(entries[index:])
+                    break
+                entry[0] += 1
+                if entry[0] < self.max_attempts:
+                    retry.append(entry)
+                else:
+                    self.dropped += 1
+                    logging.error(f"Dropping chat message for user {entry[1].get('user_id')} "
+                                  f"after {entry[0]} failed attempts: {error}")
+        if retry:
+            self._requeue(retry)
+        return written
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.retry_delay or self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+
+
+chat_write_buffer = ChatWriteBuffer()
+atexit.register(chat_write_buffer.flush)
+
+
+def save_chat_exchange(user_id, user_message, sent_at, bot_response=None, replied_at=None):
+    """Persist a user message and the bot's reply as a single write.
+
+    Requires an application context. With CHAT_WRITE_BEHIND the rows are
+    handed to the write-behind buffer instead of being committed here.
+    """
+    rows = chat_exchange_rows(user_id, user_message, sent_at, bot_response, replied_at)
+    if CHAT_WRITE_BEHIND:
+        chat_write_buffer.add(current_app._get_current_object(), rows)
+        return
+    try:
+        db.session.execute(insert(ChatMessage), rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
@@ -0,0 +1,71 @@
+"""
+Shared pytest fixtures for the Learnify application.
+"""
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from extensions import db
+import achievements
+import catalog
+import identity
+import leaderboard
+import verification
+
+TEST_CONFIG = {
+    'TESTING': True,
+    'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+    'SQLALCHEMY_ENGINE_OPTIONS': {},
+    'WTF_CSRF_ENABLED': False,
+    'RATELIMIT_ENABLED': False,
+    'SERVER_NAME': 'localhost',
+}
+
+
+@pytest.fixture
+def app():
+    """Create an application backed by a fresh in-memory database."""
+    leaderboard.reset_ranking()
+    catalog.invalidate_catalog()
+    achievements.invalidate_registry()
+    verification.reset_verification()
+    identity.reset_identities()
+    app = create_app(TEST_CONFIG)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, username='admin', password='admin123'):
+    """Log a user in through the main login form."""
+    return client.post('/login', data={'username': username, 'password': password})
+
+
+@contextmanager
+def count_queries(app):
+    """Count the SQL statements executed against the app's engine."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
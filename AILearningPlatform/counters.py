@@ -0,0 +1,123 @@
+"""
+Enrollment and award counters for the admin dashboard.
+
+CourseEnrollmentCount and AchievementAwardCount hold one row per course and
+per badge. Every enrollment or award adjusts its counter with an
+INSERT ... ON CONFLICT upsert in the same transaction as the write, so the
+admin page reads O(courses + achievements) rows instead of grouping all of
+Enrollment and UserAchievement. Writes that bypass the ORM (query-level
+deletes, manual SQL) are not counted; reconcile_counters() rebuilds both
+tables from scratch and reports how many counters had drifted.
+
+Usage: python counters.py
+"""
+import os
+import sys
+from collections import Counter
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import delete, event, func, insert, inspect, select
+
+from extensions import db
+from models import Achievement, AchievementAwardCount, CourseEnrollmentCount, Enrollment, UserAchievement
+from utils import conflict_insert
+
+
+def increment_counts(connection, model, key, deltas):
+    """Add deltas ({key value: change}) to model's counters in one upsert on connection."""
+    rows = [{key: value, 'total': change} for value, change in deltas.items() if change]
+    if not rows:
+        return
+    statement = conflict_insert(model, connection).values(rows)
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[key],
+        set_={'total': model.total + statement.excluded.total}
+    ))
+
+
+def count_awards(connection, achievement_ids):
+    """Count newly inserted UserAchievement rows; for inserts that bypass the ORM."""
+    increment_counts(connection, AchievementAwardCount, 'achievement_id', Counter(achievement_ids))
+
+
+def get_enrollment_counts():
+    """Return {course_id: enrollments}."""
+    return dict(db.session.query(CourseEnrollmentCount.course_id, CourseEnrollmentCount.total).all())
+
+
+def get_award_counts():
+    """Return [(achievement title, awards)] for every achievement, most awarded first."""
+    return db.session.query(
+        Achievement.title, func.coalesce(AchievementAwardCount.total, 0)
+    ).outerjoin(
+        AchievementAwardCount, AchievementAwardCount.achievement_id == Achievement.id
+    ).order_by(
+        func.coalesce(AchievementAwardCount.total, 0).desc(), Achievement.id
+    ).all()
+
+
+def _rebuild(model, key, source_column, source_id):
+    before = dict(db.session.execute(select(getattr(model, key), model.total)).all())
+    db.session.execute(delete(model))
+    db.session.execute(insert(model).from_select(
+        [key, 'total'],
+        select(source_column, func.count(source_id)).group_by(source_column)
+    ))
+    after = dict(db.session.execute(select(getattr(model, key), model.total)).all())
+    return sum(1 for value in before.keys() | after.keys() if before.get(value, 0) != after.get(value, 0))
+
+
+def reconcile_counters():
+    """Rebuild both counter tables from Enrollment and UserAchievement and commit.
+
+    Requires an app context. Returns the number of course and achievement
+    counters that were wrong, so a clean run reports zeros.
+    """
+    drift = {
+        'courses': _rebuild(CourseEnrollmentCount, 'course_id', Enrollment.course_id, Enrollment.id),
+        'achievements': _rebuild(AchievementAwardCount, 'achievement_id',
+                                 UserAchievement.achievement_id, UserAchievement.id)
+    }
+    db.session.commit()
+    return drift
+
+
+# ORM writes adjust the counters inside the flush, on the flush's connection
+def _counting(model, key, attribute, delta):
+    def listener(mapper, connection, target):
+        increment_counts(connection, model, key, {getattr(target, attribute): delta})
+    return listener
+
+
+def _recounting(model, key, attribute):
+    def listener(mapper, connection, target):
+        history = inspect(target).attrs[attribute].history
+        if history.has_changes() and history.deleted:
+            deltas = Counter(history.added)
+            deltas.subtract(history.deleted)
+            increment_counts(connection, model, key, deltas)
+    return listener
+
+
+for _source, _model, _key, _attribute in (
+    (Enrollment, CourseEnrollmentCount, 'course_id', 'course_id'),
+    (UserAchievement, AchievementAwardCount, 'achievement_id', 'achievement_id'),
+):
+    event.listen(_source, 'after_insert', _counting(_model, _key, _attribute, 1))
+    event.listen(_source, 'after_delete', _counting(_model, _key, _attribute, -1))
+    event.listen(_source, 'after_update', _recounting(_model, _key, _attribute))
+
+
+def main():
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        drift = reconcile_counters()
+    print(f"Reconciled counters: fixed {drift['courses']} course enrollment counts "
+          f"and {drift['achievements']} achievement award counts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Persistent email outbox for the e-learning platform.
+
+Request handlers call queue_email(), which adds an OutboxEmail row to the
+current transaction, so the email exists only if the request's commit
+succeeds and the request never talks to the SMTP server. A background
+sender claims due rows in batches, sends each batch over one reused SMTP
+connection, and reschedules failures with exponential backoff.
+
+With OUTBOX_SEND_IN_BACKGROUND=false no thread is started in the web
+process; run `python email_outbox.py` as a separate sender instead.
+"""
+import logging
+import os
+import smtplib
+import socket
+import sys
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import event, update
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from extensions import db, mail
+from models import OutboxEmail
+
+OUTBOX_SEND_IN_BACKGROUND = os.environ.get('OUTBOX_SEND_IN_BACKGROUND', 'true').lower() in ['true', 'on', '1']
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 50))
+OUTBOX_POLL_SECONDS = float(os.environ.get('OUTBOX_POLL_SECONDS', 5))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 6))
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RETRY_MAX_SECONDS = 3600
+# A claimed batch not finished within this time (e.g. the sender died) is claimed again
+OUTBOX_CLAIM_SECONDS = 300
+
+PENDING = 'pending'
+SENT = 'sent'
+FAILED = 'failed'
+
+SESSION_QUEUED_KEY = 'outbox_queued'
+
+# Errors after which the SMTP connection is unusable for the rest of the batch.
+# Other SMTP errors (refused recipients, 4xx/5xx replies) fail only their email.
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError,
+                     ConnectionError, TimeoutError, socket.gaierror)
+
+
+def queue_email(recipients, subject, body=None, html=None, attachment_path=None,
+                attachment_name=None, attachment_type=None):
+    """Add an email to the outbox in the current transaction; the caller commits.
+
+    Requires an app context. The attachment is read from attachment_path
+    when the email is sent.
+    """
+    email = OutboxEmail(
+        recipients=list(recipients),
+        subject=subject,
+        body=body,
+        html=html,
+        attachment_path=attachment_path,
+        attachment_name=attachment_name,
+        attachment_type=attachment_type
+    )
+    db.session.add(email)
+    db.session.info[SESSION_QUEUED_KEY] = current_app._get_current_object()
+    return email
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), OUTBOX_RETRY_MAX_SECONDS))
+
+
+def build_message(email):
+    message = Message(subject=email.subject, recipients=email.recipients, body=email.body, html=email.html)
+    if email.attachment_path:
+        with open(email.attachment_path, 'rb') as fp:
+            message.attach(email.attachment_name or os.path.basename(email.attachment_path),
+                           email.attachment_type or 'application/octet-stream', fp.read())
+    return message
+
+
+def claim_batch(limit=None):
+    """Claim up to limit (default OUTBOX_BATCH_SIZE) due emails. Requires an app context.
+
+    The claim pushes next_attempt_at forward, so concurrent senders in other
+    processes skip the batch, and a batch abandoned by a dead sender becomes
+    due again once the claim lapses.
+    """
+    limit = limit or OUTBOX_BATCH_SIZE
+    now = datetime.utcnow()
+    ids = [email_id for (email_id,) in db.session.query(OutboxEmail.id).filter(
+        OutboxEmail.status == PENDING,
+        OutboxEmail.next_attempt_at <= now
+    ).order_by(OutboxEmail.id).limit(limit).all()]
+    if not ids:
+        return []
+
+    token = str(uuid.uuid4())
+    db.session.execute(update(OutboxEmail).where(
+        OutboxEmail.id.in_(ids),
+        OutboxEmail.status == PENDING,
+        OutboxEmail.next_attempt_at <= now
+    ).values(claim_token=token, next_attempt_at=now + timedelta(seconds=OUTBOX_CLAIM_SECONDS)))
+    db.session.commit()
+    return OutboxEmail.query.filter_by(claim_token=token, status=PENDING).order_by(OutboxEmail.id).all()
+
+
+def record_failure(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= OUTBOX_MAX_ATTEMPTS:
+        email.status = FAILED
+        logging.error(f"Giving up on email {email.id} after {email.attempts} attempts: {error}")
+    else:
+        email.next_attempt_at = datetime.utcnow() + retry_delay(email.attempts)
+        logging.warning(f"Email {email.id} failed (attempt {email.attempts}), will retry: {error}")
+
+
+def send_pending(app):
+    """Send every due email, reusing one SMTP connection across batches.
+
+    Returns the number of emails sent.
+    """
+    sent = 0
+    with app.app_context():
+        batch = claim_batch()
+        if not batch:
+            return 0
+        unsent = batch
+        try:
+            with mail.connect() as connection:
+                while batch:
+                    for index, email in enumerate(batch):
+                        try:
+                            message = build_message(email)
+                        except Exception as e:
+                            # e.g. the attachment is missing
+                            record_failure(email, e)
+                            continue
+                        try:
+                            connection.send(message)
+                        except CONNECTION_ERRORS:
+                            unsent = batch[index:]
+                            raise
+                        except Exception as e:
+                            record_failure(email, e)
+                        else:
+                            email.status = SENT
+                            email.sent_at = datetime.utcnow()
+                            email.claim_token = None
+                            sent += 1
+                    unsent = []
+                    db.session.commit()
+                    batch = unsent = claim_batch()
+        except CONNECTION_ERRORS as e:
+            # Connecting failed or the server dropped the session; the rest
+            # of the batch waits for a fresh connection
+            for email in unsent:
+                record_failure(email, e)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error sending queued email: {e}")
+    return sent
+
+
+def pending_count():
+    """Number of emails still waiting to be sent, including ones backing off. Requires an app context."""
+    return OutboxEmail.query.filter_by(status=PENDING).count()
+
+
+class OutboxSender:
+    """Background thread that drains the outbox.
+
+    The thread starts when an email is queued and polls every poll_interval
+    seconds (retries included) until the outbox holds no pending emails.
+    """
+
+    def __init__(self, poll_interval=OUTBOX_POLL_SECONDS):
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._app = None
+
+    def wake(self, app):
+        with self._lock:
+            self._app = app
+            self._wakeup.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='email-outbox', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            app = self._app
+            try:
+                send_pending(app)
+                with app.app_context():
+                    remaining = pending_count()
+            except Exception as e:
+                logging.error(f"Email outbox sender error: {e}")
+                remaining = 1
+            with self._lock:
+                if not remaining and not self._wakeup.is_set():
+                    self._thread = None
+                    return
+            self._wakeup.wait(self.poll_interval)
+
+
+outbox_sender = OutboxSender()
+
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_sender(session):
+    app = session.info.pop(SESSION_QUEUED_KEY, None)
+    if app is not None and OUTBOX_SEND_IN_BACKGROUND:
+        outbox_sender.wake(app)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_queued(session):
+    session.info.pop(SESSION_QUEUED_KEY, None)
+
+
+def main():
+    """Run a standalone sender for deployments that disable the in-process thread."""
+    import time
+    from app import create_app
+    app = create_app()
+    while True:
+        sent = send_pending(app)
+        if sent:
+            print(f"Sent {sent} emails")
+        time.sleep(OUTBOX_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Cached identity loading for Flask-Login.
+
+The user_loader runs on every authenticated request (page views, AJAX
+calls, SSE reconnects), so the column values of recently seen users are
+kept in memory for IDENTITY_TTL_SECONDS and the User is rebuilt from them
+and attached to the request's session without a query. A committed write
+to a User row drops its entry at once; writes made by another worker
+process are picked up when the entry expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached, object_session
+
+from extensions import db, login_manager
+from models import User
+
+IDENTITY_TTL_SECONDS = 30
+IDENTITY_CACHE_SIZE = 10000
+
+SESSION_CHANGED_KEY = 'identity_changed_users'
+
+# user_id -> (expires_at, column values)
+_identities = OrderedDict()
+_lock = threading.Lock()
+# Bumped on every invalidation, so a load that raced with a write is not cached
+_generation = 0
+
+
+def user_columns(user):
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+
+def attach_user(columns):
+    """Rebuild a User from cached column values as a persistent instance of the current session."""
+    user = User()
+    for key, value in columns.items():
+        setattr(user, key, value)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def reset_identities():
+    """Forget every cached identity (e.g. when switching databases in tests)."""
+    global _generation
+    with _lock:
+        _identities.clear()
+        _generation += 1
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    with _lock:
+        entry = _identities.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            _identities.move_to_end(user_id)
+            columns = entry[1]
+        else:
+            columns = None
+        generation = _generation
+    if columns is not None:
+        return attach_user(columns)
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        columns = user_columns(user)
+        with _lock:
+            if generation == _generation:
+                _identities[user_id] = (time.monotonic() + IDENTITY_TTL_SECONDS, columns)
+                _identities.move_to_end(user_id)
+                while len(_identities) > IDENTITY_CACHE_SIZE:
+                    _identities.popitem(last=False)
+    return user
+
+
+# Invalidation: collect written users during the flush, drop them on commit
+def _track_user_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(SESSION_CHANGED_KEY, set()).add(target.id)
+
+
+event.listen(User, 'after_update', _track_user_change)
+event.listen(User, 'after_delete', _track_user_change)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_user_changes(session):
+    global _generation
+    changed = session.info.pop(SESSION_CHANGED_KEY, None)
+    if changed:
+        with _lock:
+            for user_id in changed:
+                _identities.pop(user_id, None)
+            _generation += 1
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_user_changes(session):
+    session.info.pop(SESSION_CHANGED_KEY, None)
@@ -0,0 +1,368 @@
+"""
+Leaderboard ranking for the e-learning platform.
+
+Keeps an in-process ranking index ordered by XP and completed courses. The
+index is built once from a single aggregate query and is then kept current
+incrementally: writes to Enrollment or User rows mark the affected users as
+dirty when their transaction commits, and only those users are re-aggregated
+on the next read. Top-N and rank lookups are binary searches on the index.
+"""
+import bisect
+import datetime
+import logging
+import queue
+import threading
+import time
+
+from sqlalchemy import event, func, case, or_
+from sqlalchemy.orm import object_session
+
+from extensions import db
+from models import User, Course, Enrollment
+
+# Other worker processes update their own index, so each one also does a full
+# rebuild this often to pick up changes committed elsewhere.
+REBUILD_INTERVAL_SECONDS = 300
+
+# Streaming: how often the publisher recomputes, and how long a connection may
+# stay silent before a heartbeat comment is sent to keep proxies from closing it
+PUBLISH_INTERVAL_SECONDS = 10
+HEARTBEAT_SECONDS = 15
+TOP_N = 10
+
+SESSION_DIRTY_KEY = 'leaderboard_dirty_user_ids'
+
+
+class RankingIndex:
+    """Order-statistic index of leaderboard entries keyed by user id.
+
+    Entries are kept in a sorted list of ranking keys, so rank and top-N
+    lookups are binary searches/slices and a single user's update is a
+    binary search plus one list insert.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._entries = {}
+        self._lock = threading.RLock()
+        # Bumped on every change so readers can cheaply detect updates
+        self.generation = 0
+
+    @staticmethod
+    def ranking_key(entry):
+        # Sort by XP (primary), then completed courses (secondary), then user id for stability
+        return (-entry['xp'], -entry['completed_courses'], entry['user_id'])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, user_id):
+        return user_id in self._entries
+
+    def update(self, entry):
+        """Insert or replace the entry for entry['user_id']."""
+        with self._lock:
+            self.remove(entry['user_id'])
+            self._entries[entry['user_id']] = entry
+            bisect.insort(self._keys, self.ranking_key(entry))
+            self.generation += 1
+
+    def remove(self, user_id):
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is None:
+                return
+            key = self.ranking_key(entry)
+            position = bisect.bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+            self.generation += 1
+
+    def replace_all(self, entries):
+        with self._lock:
+            self._entries = {entry['user_id']: entry for entry in entries}
+            self._keys = sorted(self.ranking_key(entry) for entry in entries)
+            self.generation += 1
+
+    def rank(self, user_id):
+        """Return the 1-based rank of a user, or None if the user is not ranked."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            return bisect.bisect_left(self._keys, self.ranking_key(entry)) + 1
+
+    def get(self, user_id):
+        with self._lock:
+            return self._entries.get(user_id)
+
+    def top(self, n):
+        """Return the first n entries in rank order."""
+        with self._lock:
+            return [self._entries[key[2]] for key in self._keys[:n]]
+
+
+ranking_index = RankingIndex()
+_dirty_user_ids = set()
+_state_lock = threading.Lock()
+_last_rebuild = None
+
+
+def completion_fraction(column):
+    """SQL expression normalising Enrollment.completion to 0.0-1.0.
+
+    Progress updates store a fraction while quiz completion stores 100.
+    """
+    completion = func.coalesce(column, 0.0)
+    return case(
+        (completion >= 100.0, 1.0),
+        (completion > 1.0, completion / 100.0),
+        else_=completion
+    )
+
+
+def load_user_stats(user_ids=None):
+    """Aggregate leaderboard stats for the given users (or all users) in one query."""
+    completed = or_(Enrollment.completed_at.isnot(None), Enrollment.completion >= 1.0)
+    query = db.session.query(
+        User.id,
+        User.username,
+        User.profile_image_url,
+        func.count(Enrollment.id),
+        func.sum(case((completed, 1), else_=0)),
+        func.sum(case((Enrollment.completion > 0, 1), else_=0)),
+        func.sum(completion_fraction(Enrollment.completion))
+    ).outerjoin(
+        Enrollment, Enrollment.user_id == User.id
+    ).group_by(
+        User.id, User.username, User.profile_image_url
+    )
+    if user_ids is not None:
+        query = query.filter(User.id.in_(user_ids))
+
+    entries = []
+    for user_id, username, image, enrolled, completed_count, started, progress_sum in query.all():
+        completed_count = completed_count or 0
+        progress_sum = float(progress_sum or 0.0)
+        entries.append({
+            'user_id': user_id,
+            'username': username,
+            'profile_image_url': image,
+            'xp': int(round(progress_sum * 100)),
+            'completed_courses': completed_count,
+            'in_progress_courses': max((started or 0) - completed_count, 0),
+            'avg_progress': progress_sum / enrolled if enrolled else 0.0
+        })
+    return entries
+
+
+def rebuild_ranking():
+    """Rebuild the whole index from the database."""
+    global _last_rebuild
+    with _state_lock:
+        _dirty_user_ids.clear()
+    ranking_index.replace_all(load_user_stats())
+    _last_rebuild = time.monotonic()
+    logging.debug(f"Leaderboard index rebuilt with {len(ranking_index)} users")
+
+
+def refresh_ranking():
+    """Bring the index up to date before a read.
+
+    Must be called inside an application context.
+    """
+    if _last_rebuild is None or time.monotonic() - _last_rebuild > REBUILD_INTERVAL_SECONDS:
+        rebuild_ranking()
+        return
+
+    with _state_lock:
+        if not _dirty_user_ids:
+            return
+        user_ids = set(_dirty_user_ids)
+        _dirty_user_ids.clear()
+
+    fresh = {entry['user_id']: entry for entry in load_user_stats(user_ids)}
+    for user_id in user_ids:
+        if user_id in fresh:
+            ranking_index.update(fresh[user_id])
+        else:
+            ranking_index.remove(user_id)
+
+
+def mark_users_dirty(user_ids):
+    with _state_lock:
+        _dirty_user_ids.update(user_ids)
+
+
+def reset_ranking():
+    """Drop all cached ranking state (e.g. when switching databases in tests)."""
+    global _last_rebuild
+    with _state_lock:
+        _dirty_user_ids.clear()
+    ranking_index.replace_all([])
+    _last_rebuild = None
+
+
+def get_top(n):
+    refresh_ranking()
+    return [(position, entry) for position, entry in enumerate(ranking_index.top(n), 1)]
+
+
+def get_rank(user_id):
+    """Return (rank, entry) for a user, or (None, None) if the user is unknown."""
+    refresh_ranking()
+    entry = ranking_index.get(user_id)
+    if entry is None:
+        return None, None
+    return ranking_index.rank(user_id), entry
+
+
+def peek_rank(user_id):
+    """Like get_rank() but never touches the database."""
+    entry = ranking_index.get(user_id)
+    if entry is None:
+        return None, None
+    return ranking_index.rank(user_id), entry
+
+
+class LeaderboardBroadcaster:
+    """Single publisher that fans leaderboard snapshots out to SSE subscribers.
+
+    One background thread recomputes the leaderboard per tick, however many
+    clients are connected, and hands the snapshot to every subscriber queue
+    only when the ranking actually changed. The thread starts with the first
+    subscriber and exits once the last one disconnects.
+    """
+
+    def __init__(self, interval=PUBLISH_INTERVAL_SECONDS, top_n=TOP_N):
+        self.interval = interval
+        self.top_n = top_n
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._latest = None
+        self._latest_key = None
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self, app):
+        """Register a subscriber and return its queue of snapshots."""
+        subscriber = queue.Queue(maxsize=1)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._latest is not None:
+                subscriber.put_nowait(self._latest)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, args=(app,), name='leaderboard-publisher', daemon=True
+                )
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers:
+                self._wakeup.set()
+
+    def build_snapshot(self):
+        """Compute the shared part of the leaderboard. Requires an app context."""
+        refresh_ranking()
+        total_courses = Course.query.count()
+        return {
+            'top': list(enumerate(ranking_index.top(self.top_n), 1)),
+            'total_courses': total_courses,
+            'generation': ranking_index.generation,
+            'updated_at': datetime.datetime.utcnow().isoformat()
+        }
+
+    def publish(self, snapshot):
+        """Hand a snapshot to every subscriber, replacing any undelivered one."""
+        with self._lock:
+            self._latest = snapshot
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                subscriber.put_nowait(snapshot)
+            except queue.Full:
+                pass
+
+    def _run(self, app):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    self._latest = None
+                    self._latest_key = None
+                    return
+            try:
+                with app.app_context():
+                    snapshot = self.build_snapshot()
+                key = (snapshot['generation'], snapshot['total_courses'])
+                if key != self._latest_key:
+                    self._latest_key = key
+                    self.publish(snapshot)
+            except Exception as e:
+                logging.error(f"Error in leaderboard publisher: {str(e)}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def stream(self, app, format_snapshot):
+        """Yield SSE frames for one client until it disconnects.
+
+        format_snapshot(snapshot) turns a shared snapshot into this client's
+        payload; identical consecutive payloads are not resent.
+        """
+        subscriber = self.subscribe(app)
+        last_sent = None
+        try:
+            while True:
+                try:
+                    snapshot = subscriber.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                payload = format_snapshot(snapshot)
+                if payload != last_sent:
+                    last_sent = payload
+                    yield f"data: {payload}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+broadcaster = LeaderboardBroadcaster()
+
+
+# Change tracking: remember the users touched during a flush and publish them
+# to the index only once the transaction commits.
+def _track_change(user_id_attr):
+    def handler(mapper, connection, target):
+        session = object_session(target)
+        user_id = getattr(target, user_id_attr)
+        if session is not None and user_id is not None:
+            session.info.setdefault(SESSION_DIRTY_KEY, set()).add(user_id)
+    return handler
+
+
+for _operation in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Enrollment, _operation, _track_change('user_id'))
+    event.listen(User, _operation, _track_change('id'))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_dirty_users(session):
+    user_ids = session.info.pop(SESSION_DIRTY_KEY, None)
+    if user_ids:
+        mark_users_dirty(user_ids)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_dirty_users(session):
+    session.info.pop(SESSION_DIRTY_KEY, None)
@@ -0,0 +1,52 @@
+"""Add composite indexes and uniqueness on hot lookup paths
+
+Revision ID: 4c2e8f1a9b3d
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c2e8f1a9b3d'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (table, index name, columns, unique)
+INDEXES = [
+    ('enrollments', 'uq_enrollment_user_course', ['user_id', 'course_id'], True),
+    ('progress', 'uq_progress_user_course_module', ['user_id', 'course_id', 'module_id'], True),
+    ('user_achievements', 'uq_user_achievement_user_achievement', ['user_id', 'achievement_id'], True),
+    ('quiz_attempts', 'ix_quiz_attempt_user_course', ['user_id', 'course_id'], False),
+    ('chat_messages', 'ix_chat_message_user_timestamp', ['user_id', 'timestamp'], False),
+]
+
+
+def remove_duplicates(table, columns):
+    """Keep the oldest row of each duplicate group so a unique index can be built."""
+    key = ', '.join(columns)
+    op.execute(
+        f'DELETE FROM {table} WHERE id NOT IN '
+        f'(SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM {table} GROUP BY {key}) AS keepers)'
+    )
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table, name, columns, unique in INDEXES:
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        if name in existing:
+            # Databases built with db.create_all() already have the index
+            continue
+        if unique:
+            remove_duplicates(table, columns)
+        op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    for table, name, columns, unique in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
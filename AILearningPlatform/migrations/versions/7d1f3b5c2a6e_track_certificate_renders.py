@@ -0,0 +1,32 @@
+"""Track rendered certificate files on the certificate row
+
+Revision ID: 7d1f3b5c2a6e
+Revises: 4c2e8f1a9b3d
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d1f3b5c2a6e'
+down_revision = '4c2e8f1a9b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('certificates')}
+    with op.batch_alter_table('certificates', schema=None) as batch_op:
+        # Databases built with db.create_all() already have the columns
+        if 'pdf_url' not in existing:
+            batch_op.add_column(sa.Column('pdf_url', sa.String(length=255), nullable=True))
+        if 'rendered_at' not in existing:
+            batch_op.add_column(sa.Column('rendered_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('certificates', schema=None) as batch_op:
+        batch_op.drop_column('rendered_at')
+        batch_op.drop_column('pdf_url')
@@ -0,0 +1,47 @@
+"""Add the email outbox table
+
+Revision ID: 9a4e2c7b1f05
+Revises: 7d1f3b5c2a6e
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4e2c7b1f05'
+down_revision = '7d1f3b5c2a6e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases built with db.create_all() already have the table
+    if 'email_outbox' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('recipients', sa.JSON(), nullable=False),
+        sa.Column('subject', sa.String(length=255), nullable=False),
+        sa.Column('body', sa.Text(), nullable=True),
+        sa.Column('html', sa.Text(), nullable=True),
+        sa.Column('attachment_path', sa.String(length=255), nullable=True),
+        sa.Column('attachment_name', sa.String(length=255), nullable=True),
+        sa.Column('attachment_type', sa.String(length=100), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('claim_token', sa.String(length=36), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_email_outbox_status_next_attempt', 'email_outbox', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_email_outbox_status_next_attempt', table_name='email_outbox')
+    op.drop_table('email_outbox')
@@ -0,0 +1,50 @@
+"""Add enrollment and award counter tables
+
+Revision ID: b3f6d8e2a4c1
+Revises: 9a4e2c7b1f05
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f6d8e2a4c1'
+down_revision = '9a4e2c7b1f05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases built with db.create_all() already have the tables
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'course_enrollment_counts' not in existing:
+        op.create_table(
+            'course_enrollment_counts',
+            sa.Column('course_id', sa.Integer(), nullable=False),
+            sa.Column('total', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('course_id')
+        )
+        op.execute(
+            'INSERT INTO course_enrollment_counts (course_id, total) '
+            'SELECT course_id, COUNT(id) FROM enrollments GROUP BY course_id'
+        )
+    if 'achievement_award_counts' not in existing:
+        op.create_table(
+            'achievement_award_counts',
+            sa.Column('achievement_id', sa.Integer(), nullable=False),
+            sa.Column('total', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['achievement_id'], ['achievements.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('achievement_id')
+        )
+        op.execute(
+            'INSERT INTO achievement_award_counts (achievement_id, total) '
+            'SELECT achievement_id, COUNT(id) FROM user_achievements GROUP BY achievement_id'
+        )
+
+
+def downgrade():
+    op.drop_table('achievement_award_counts')
+    op.drop_table('course_enrollment_counts')
@@ -8,9 +8,9 @@ import json
 from extensions import db
 from flask_login import UserMixin
 from sqlalchemy.ext.mutable import MutableList
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
-from werkzeug.security import generate_password_hash, check_password_hash
+import passwords
 
 
 class User(UserMixin, db.Model):
@@ -44,10 +44,21 @@ class User(UserMixin, db.Model):
     quiz_attempts = relationship('QuizAttempt', back_populates='user', lazy='dynamic', cascade='all, delete-orphan')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.password_hasher.hash(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """Verify a password on the hashing pool.
+        
+        A correct password stored with outdated hash parameters is rehashed
+        in place; the caller's commit saves the new hash. May raise
+        passwords.PasswordHashingBusy.
+        """
+        hasher = passwords.password_hasher
+        if not hasher.verify(self.password_hash, password):
+            return False
+        if hasher.needs_rehash(self.password_hash):
+            self.password_hash = hasher.hash(password)
+        return True
         
     def get_id(self):
         return str(self.id)
@@ -197,6 +208,9 @@ class QuizQuestion(db.Model):
 class QuizAttempt(db.Model):
     """Tracks user quiz attempts and scores."""
     __tablename__ = 'quiz_attempts'
+    __table_args__ = (
+        Index('ix_quiz_attempt_user_course', 'user_id', 'course_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
@@ -216,6 +230,9 @@ class QuizAttempt(db.Model):
 class Enrollment(db.Model):
     """Enrollment model linking users to courses."""
     __tablename__ = 'enrollments'
+    __table_args__ = (
+        Index('uq_enrollment_user_course', 'user_id', 'course_id', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -236,6 +253,9 @@ class Enrollment(db.Model):
 class Progress(db.Model):
     """Progress model to track user progress in courses."""
     __tablename__ = 'progress'
+    __table_args__ = (
+        Index('uq_progress_user_course_module', 'user_id', 'course_id', 'module_id', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -274,6 +294,9 @@ class Achievement(db.Model):
 class UserAchievement(db.Model):
     """User Achievement model linking users to achievements."""
     __tablename__ = 'user_achievements'
+    __table_args__ = (
+        Index('uq_user_achievement_user_achievement', 'user_id', 'achievement_id', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -305,6 +328,28 @@ class Streak(db.Model):
         return f'<Streak user_id={self.user_id} current={self.current_streak} max={self.max_streak}>'
 
 
+class CourseEnrollmentCount(db.Model):
+    """Running number of enrollments per course, maintained by counters.py."""
+    __tablename__ = 'course_enrollment_counts'
+
+    course_id = Column(Integer, ForeignKey('courses.id', ondelete='CASCADE'), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CourseEnrollmentCount course_id={self.course_id} total={self.total}>'
+
+
+class AchievementAwardCount(db.Model):
+    """Running number of awards per achievement, maintained by counters.py."""
+    __tablename__ = 'achievement_award_counts'
+
+    achievement_id = Column(Integer, ForeignKey('achievements.id', ondelete='CASCADE'), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AchievementAwardCount achievement_id={self.achievement_id} total={self.total}>'
+
+
 class Certificate(db.Model):
     """Certificate model for course completion certificates."""
     __tablename__ = 'certificates'
@@ -314,7 +359,9 @@ class Certificate(db.Model):
     course_id = Column(Integer, ForeignKey('courses.id', ondelete='CASCADE', name='fk_certificate_course'), nullable=False)
     issue_date = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
     score = Column(Float, nullable=False)
-    certificate_url = Column(String(255), nullable=True)
+    certificate_url = Column(String(255), nullable=True)  # Rendered JPEG, relative to static/
+    pdf_url = Column(String(255), nullable=True)  # Rendered PDF, relative to static/
+    rendered_at = Column(DateTime, nullable=True)
     verification_code = Column(String(50), unique=True, nullable=True)
     
     # Relationships with explicit back_populates
@@ -331,80 +378,60 @@ class Certificate(db.Model):
         """Verify the certificate using the verification code."""
         return self.verification_code == code
     
-    def generate_pdf(self, output_path=None):
-        """Generate a PDF certificate."""
-        from fpdf import FPDF
-        import os
-        
-        # Create PDF
-        pdf = FPDF(orientation='L')
-        pdf.add_page()
-        
-        # Add background
-        pdf.image('static/images/certificate_bg.jpg', 0, 0, 297, 210)  # A4 landscape
-        
-        # Add content
-        pdf.set_font('Arial', 'B', 24)
-        pdf.set_text_color(0, 0, 0)
-        
-        # Title
-        pdf.cell(0, 40, '', 0, 1)
-        pdf.cell(0, 20, 'CERTIFICATE OF COMPLETION', 0, 1, 'C')
-        
-        # Subtitle
-        pdf.set_font('Arial', 'I', 16)
-        pdf.cell(0, 25, 'This is to certify that', 0, 1, 'C')
-        
-        # User name
-        pdf.set_font('Arial', 'B', 28)
-        pdf.cell(0, 30, self.user.username, 0, 1, 'C')
-        
-        # Course name
-        pdf.set_font('Arial', 'I', 16)
-        pdf.cell(0, 20, 'has successfully completed the course', 0, 1, 'C')
-        
-        pdf.set_font('Arial', 'B', 20)
-        pdf.cell(0, 20, f'"{self.course.title}"', 0, 1, 'C')
-        
-        # Score and date
-        pdf.set_font('Arial', '', 14)
-        pdf.cell(0, 20, f'with a score of {self.score}%', 0, 1, 'C')
-        
-        # Issue date
-        pdf.set_font('Arial', 'I', 12)
-        pdf.cell(0, 20, f'Issued on {self.issue_date.strftime("%B %d, %Y")}', 0, 1, 'C')
+    @property
+    def is_rendered(self):
+        """True when both the JPEG and the PDF are in certificate storage."""
+        import certificate_storage
+        return all(
+            certificate_storage.is_stored(certificate_storage.name_from_url(url))
+            for url in (self.certificate_url, self.pdf_url)
+        )
+    
+    @property
+    def pdf_path(self):
+        import certificate_storage
+        name = certificate_storage.name_from_url(self.pdf_url)
+        return certificate_storage.stored_path(name) if name else None
+    
+    def record_renders(self, stored_names):
+        """Point the certificate at stored renders, given {'jpg': name, 'pdf': name}."""
+        import certificate_storage
+        self.certificate_url = certificate_storage.url_for_name(stored_names['jpg'])
+        self.pdf_url = certificate_storage.url_for_name(stored_names['pdf'])
+        self.rendered_at = datetime.datetime.utcnow()
+    
+    def generate_pdf(self):
+        """Render the certificate as JPEG and PDF and record both. Returns the PDF path.
+        
+        This renders synchronously; request handlers should queue
+        certificate_jobs.request_certificate() instead.
+        """
+        from certificate_generator import render_certificate
+        import certificate_storage
         
-        # Verification code
         if not self.verification_code:
             self.generate_verification_code()
-            db.session.commit()
-            
-        pdf.set_text_color(128, 128, 128)
-        pdf.set_font('Arial', '', 10)
-        pdf.cell(0, 10, f'Verification Code: {self.verification_code}', 0, 1, 'C')
-        
-        # Save the PDF
-        if not output_path:
-            os.makedirs('static/certificates', exist_ok=True)
-            output_path = f'static/certificates/certificate_{self.id}.pdf'
-        
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
-        pdf.output(output_path, 'F')
-        self.certificate_url = output_path
+        outputs = render_certificate(
+            self.user.username,
+            self.course.title,
+            self.verification_code,
+            self.issue_date.strftime("%B %d, %Y")
+        )
+        self.record_renders({
+            extension: certificate_storage.store(data, extension)
+            for extension, data in outputs.items()
+        })
         db.session.commit()
-        
-        return output_path
+        return self.pdf_path
     
     def send_certificate_email(self):
-        """Send the certificate to the user's email."""
-        from flask import current_app, render_template, url_for
-        from flask_mail import Message
-        from extensions import mail
+        """Queue the certificate email, with the PDF attached, in the outbox."""
+        from flask import render_template, url_for
+        from email_outbox import queue_email
         
         # Generate PDF if not already generated
-        if not self.certificate_url or not os.path.exists(self.certificate_url):
+        if not self.is_rendered:
             self.generate_pdf()
         
         # Prepare email
@@ -416,26 +443,19 @@ class Certificate(db.Model):
             user=self.user,
             course=self.course,
             certificate=self,
-            verification_url=url_for('verify_certificate', code=self.verification_code, _external=True)
+            verification_url=url_for('auth.verify_certificate', code=self.verification_code, _external=True)
         )
         
-        # Create message
-        msg = Message(
-            subject=subject,
-            recipients=[self.user.email],
-            html=html_body
+        # The sender reads the attachment when it sends the email
+        queue_email(
+            [self.user.email],
+            subject,
+            html=html_body,
+            attachment_path=self.pdf_path,
+            attachment_name=f'Certificate_{self.course.title.replace(" ", "_")}.pdf',
+            attachment_type='application/pdf'
         )
-        
-        # Attach certificate
-        with current_app.open_resource(self.certificate_url) as fp:
-            msg.attach(
-                f'Certificate_{self.course.title.replace(" ", "_")}.pdf',
-                'application/pdf',
-                fp.read()
-            )
-        
-        # Send email
-        mail.send(msg)
+        db.session.commit()
     
     def __repr__(self):
         return f'<Certificate {self.id} for user {self.user_id} in course {self.course_id}>'
@@ -444,6 +464,9 @@ class Certificate(db.Model):
 class ChatMessage(db.Model):
     """Chat message model for chatbot conversations."""
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        Index('ix_chat_message_user_timestamp', 'user_id', 'timestamp'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE', name='fk_chatmessage_user'), nullable=False)
@@ -466,3 +489,31 @@ class ChatMessage(db.Model):
     
     def __repr__(self):
         return f'<ChatMessage {self.id} from user {self.user_id}>'
+
+
+class OutboxEmail(db.Model):
+    """Email waiting to be sent by the background sender in email_outbox.py."""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    recipients = Column(JSON, nullable=False)  # List of addresses
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=True)
+    html = Column(Text, nullable=True)
+    # Attachments are read from disk when the email is sent, not when it is queued
+    attachment_path = Column(String(255), nullable=True)
+    attachment_name = Column(String(255), nullable=True)
+    attachment_type = Column(String(100), nullable=True)
+    status = Column(String(20), default='pending', nullable=False)  # pending, sent or failed
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    claim_token = Column(String(36), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<OutboxEmail {self.id} {self.status} to {self.recipients}>'
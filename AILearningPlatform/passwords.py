@@ -0,0 +1,119 @@
+"""
+Password hashing off the request thread.
+
+Hashing and verifying passwords is deliberately CPU-heavy, so a burst of
+logins would otherwise tie up every web worker. PasswordHasher runs the
+werkzeug hash functions on a small dedicated process pool and refuses new
+work with PasswordHashingBusy once max_pending calls are in flight, so
+ordinary page views keep being served during a login rush.
+
+PASSWORD_HASH_METHOD sets the hash and its cost using werkzeug's method
+syntax, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000". Hashes made with
+other parameters are upgraded when their owner next logs in.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+# 0 hashes on the calling thread (still bounded by PASSWORD_HASH_MAX_PENDING)
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+# 0 leaves the number of calls in flight unbounded
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))
+PASSWORD_HASH_TIMEOUT_SECONDS = float(os.environ.get('PASSWORD_HASH_TIMEOUT_SECONDS', 10))
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when too many password hashes are already queued or a hash timed out."""
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _check(password_hash, password):
+    return check_password_hash(password_hash, password)
+
+
+class PasswordHasher:
+    """Bounded process pool for password hashing and verification."""
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING,
+                 method=PASSWORD_HASH_METHOD):
+        self.workers = workers
+        self.method = method
+        self._slots = threading.BoundedSemaphore(max_pending) if max_pending else None
+        self._pool = None
+        self._lock = threading.Lock()
+        self._method_prefix = None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # Workers start from a clean interpreter rather than a fork of
+                # the multithreaded web process
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context(start_method))
+            return self._pool
+
+    def _release(self, future=None):
+        if self._slots is not None:
+            self._slots.release()
+
+    def _run(self, function, *args):
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy("Too many password hashes in progress")
+        if not self.workers:
+            try:
+                return function(*args)
+            finally:
+                self._release()
+
+        try:
+            future = self._get_pool().submit(function, *args)
+        except BaseException:
+            self._release()
+            raise
+        # The slot stays taken until the worker is done, even if this caller
+        # stops waiting, so timed-out hashes cannot pile up behind the pool
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=PASSWORD_HASH_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            future.cancel()
+            raise PasswordHashingBusy("Password hashing timed out")
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool for the next call
+            with self._lock:
+                self._pool = None
+            raise
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(_check, password_hash, password)
+
+    @property
+    def method_prefix(self):
+        """The full method string werkzeug writes for self.method, e.g. "scrypt:32768:8:1"."""
+        if self._method_prefix is None:
+            self._method_prefix = _hash('', self.method).split('$', 1)[0]
+        return self._method_prefix
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method_prefix
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,138 @@
+"""
+Batched progress ingestion for the e-learning platform.
+
+The course page reports module progress as events
+({course_id, module_id, completion, quiz_score}). A batch of events is
+applied with one INSERT ... ON CONFLICT upsert into Progress, enrollment
+completion is recomputed once per batch for every course it touches, and
+achievements are checked once for the whole batch.
+"""
+from datetime import datetime
+
+from sqlalchemy import func
+
+from achievements import record_event, count_completed_courses
+from extensions import db
+from models import Enrollment, Module, Progress
+from utils import calculate_progress_bulk, conflict_insert
+
+PROGRESS_BATCH_MAX_EVENTS = 500
+
+
+class InvalidProgressEvent(ValueError):
+    """Raised for an event that is missing ids or has non-numeric values."""
+
+
+def _number(value, field, allow_none=False):
+    if value is None and allow_none:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise InvalidProgressEvent(f"{field} must be a number")
+    return value
+
+
+def coalesce_events(events):
+    """Validate events and merge them per module, in order.
+
+    The latest completion wins; the latest quiz score wins unless it is
+    missing. Returns {(course_id, module_id): {'completion', 'quiz_score'}}.
+    """
+    merged = {}
+    for event in events:
+        if not isinstance(event, dict) or not event.get('course_id') or not event.get('module_id'):
+            raise InvalidProgressEvent("Missing required fields (course_id or module_id)")
+        try:
+            key = (int(event['course_id']), int(event['module_id']))
+        except (TypeError, ValueError):
+            raise InvalidProgressEvent("course_id and module_id must be integers")
+        completion = _number(event.get('completion', 0), 'completion')
+        quiz_score = _number(event.get('quiz_score'), 'quiz_score', allow_none=True)
+        previous = merged.pop(key, None)
+        if quiz_score is None and previous is not None:
+            quiz_score = previous['quiz_score']
+        # Re-inserting keeps the dict in order of each module's latest event
+        merged[key] = {'completion': completion, 'quiz_score': quiz_score}
+    return merged
+
+
+def apply_progress_events(user_id, events):
+    """Apply a batch of progress events for one user in a single transaction.
+
+    Events for courses the user is not enrolled in, or for modules outside
+    their course, are skipped. Returns a summary dict with 'applied',
+    'skipped' (of which 'foreign_modules' were enrolled courses paired with
+    a module from another course), per-course 'completion' and the newly
+    awarded 'achievements'. Raises InvalidProgressEvent for malformed events.
+    """
+    merged = coalesce_events(events)
+    course_ids = {course_id for course_id, _ in merged}
+
+    enrollments = {}
+    module_courses = {}
+    if merged:
+        enrollments = {enrollment.course_id: enrollment for enrollment in Enrollment.query.filter(
+            Enrollment.user_id == user_id,
+            Enrollment.course_id.in_(course_ids)
+        ).all()}
+        module_courses = dict(db.session.query(Module.id, Module.course_id).filter(
+            Module.id.in_({module_id for _, module_id in merged})
+        ).all())
+
+    now = datetime.utcnow()
+    rows = [{
+        'user_id': user_id,
+        'course_id': course_id,
+        'module_id': module_id,
+        'completion': values['completion'],
+        'quiz_score': values['quiz_score'],
+        'last_updated': now
+    } for (course_id, module_id), values in merged.items()
+        if course_id in enrollments and module_courses.get(module_id) == course_id]
+
+    foreign_modules = sum(1 for course_id, module_id in merged
+                          if course_id in enrollments and module_courses.get(module_id) != course_id)
+
+    if not rows:
+        return {'applied': 0, 'skipped': len(merged), 'foreign_modules': foreign_modules,
+                'completion': {}, 'achievements': []}
+
+    statement = conflict_insert(Progress).values(rows)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['user_id', 'course_id', 'module_id'],
+        set_={
+            'completion': statement.excluded.completion,
+            'quiz_score': func.coalesce(statement.excluded.quiz_score, Progress.quiz_score),
+            'last_updated': statement.excluded.last_updated
+        }
+    ))
+
+    # Recompute completion once for every course in the batch
+    touched = {}
+    for row in rows:
+        touched[row['course_id']] = row['module_id']
+    completion = calculate_progress_bulk((user_id, course_id) for course_id in touched)
+
+    facts = {}
+    quiz_scores = [row['quiz_score'] for row in rows if row['quiz_score'] is not None]
+    if quiz_scores:
+        facts['score'] = max(quiz_scores)
+    for course_id, last_module_id in touched.items():
+        enrollment = enrollments[course_id]
+        enrollment.completion = completion[(user_id, course_id)]
+        enrollment.last_module = last_module_id
+        if enrollment.completion == 1.0 and enrollment.completed_at is None:
+            enrollment.completed_at = datetime.now()
+            facts['course_completed'] = True
+    if facts.get('course_completed'):
+        facts['completed_courses'] = count_completed_courses(user_id)
+
+    awarded = record_event(user_id, 'progress', **facts)
+    db.session.commit()
+
+    return {
+        'applied': len(rows),
+        'skipped': len(merged) - len(rows),
+        'foreign_modules': foreign_modules,
+        'completion': {course_id: completion[(user_id, course_id)] for course_id in touched},
+        'achievements': awarded
+    }
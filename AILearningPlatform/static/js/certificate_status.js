@@ -0,0 +1,54 @@
+/**
+ * Polls the certificate status API until a queued certificate has been rendered
+ */
+
+document.addEventListener('DOMContentLoaded', function() {
+    const POLL_INTERVAL_MS = 1000;
+    
+    document.querySelectorAll('[data-certificate-status-url]').forEach(function(container) {
+        const statusUrl = container.dataset.certificateStatusUrl;
+        const redirect = container.dataset.certificateRedirect === 'true';
+        const message = container.querySelector('[data-certificate-message]');
+        const spinner = container.querySelector('[data-certificate-spinner]');
+        const button = container.querySelector('[data-certificate-download]');
+        
+        function showReady(url) {
+            if (spinner) spinner.remove();
+            if (redirect) {
+                window.location.href = url;
+                return;
+            }
+            if (button) {
+                button.href = url;
+                button.classList.remove('disabled');
+                button.removeAttribute('aria-disabled');
+                button.innerHTML = '<i class="fas fa-download"></i> Download Certificate';
+            }
+        }
+        
+        function showFailed(text) {
+            if (spinner) spinner.remove();
+            if (message) message.textContent = text;
+        }
+        
+        function poll() {
+            fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.json())
+            .then(data => {
+                if (data.status === 'ready') {
+                    showReady(data.url);
+                } else if (data.status === 'failed' || data.status === 'missing') {
+                    showFailed(data.message || 'Certificate could not be generated. Please try again.');
+                } else {
+                    setTimeout(poll, POLL_INTERVAL_MS);
+                }
+            })
+            .catch(error => {
+                console.error('Error checking certificate status:', error);
+                setTimeout(poll, POLL_INTERVAL_MS * 5);
+            });
+        }
+        
+        poll();
+    });
+});
@@ -7,6 +7,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const chatInput = document.getElementById('chat-input');
     const chatMessages = document.getElementById('chat-messages');
     const courseSelect = document.getElementById('course-context');
+    const csrfMeta = document.querySelector('meta[name="csrf-token"]');
+    const csrfToken = csrfMeta ? csrfMeta.getAttribute('content') : '';
     
     // Function to add a message to the chat window
     function addMessage(message, isUser) {
@@ -33,6 +35,151 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Scroll to the bottom of the chat
         chatMessages.scrollTop = chatMessages.scrollHeight;
+        
+        return messageContent;
+    }
+    
+    // Build a rendered message element for a history entry
+    function historyMessage(entry) {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = entry.is_user ? 'message user-message' : 'message bot-message';
+        
+        const messageContent = document.createElement('div');
+        messageContent.className = 'message-content';
+        messageContent.textContent = entry.message;
+        
+        const messageTime = document.createElement('div');
+        messageTime.className = 'message-time';
+        messageTime.textContent = entry.timestamp;
+        
+        messageDiv.appendChild(messageContent);
+        messageDiv.appendChild(messageTime);
+        return messageDiv;
+    }
+    
+    // Load the page of messages older than the oldest one shown
+    let historyCursor = chatMessages ? chatMessages.dataset.historyCursor : null;
+    let loadingHistory = false;
+    
+    function loadOlderMessages() {
+        if (!historyCursor || loadingHistory) return;
+        loadingHistory = true;
+        
+        fetch(`/api/chat/history?before=${encodeURIComponent(historyCursor)}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.status !== 'success') {
+                throw new Error(data.message);
+            }
+            
+            // Prepend without moving what the user is looking at
+            const previousHeight = chatMessages.scrollHeight;
+            const fragment = document.createDocumentFragment();
+            data.messages.forEach(entry => fragment.appendChild(historyMessage(entry)));
+            chatMessages.insertBefore(fragment, chatMessages.firstChild);
+            chatMessages.scrollTop += chatMessages.scrollHeight - previousHeight;
+            
+            historyCursor = data.next_cursor;
+        })
+        .catch(error => {
+            console.error('Error loading chat history:', error);
+        })
+        .finally(() => {
+            loadingHistory = false;
+        });
+    }
+    
+    if (chatMessages) {
+        chatMessages.addEventListener('scroll', function() {
+            if (chatMessages.scrollTop < 100) {
+                loadOlderMessages();
+            }
+        });
+    }
+    
+    // Request the whole reply as JSON (used when streaming is unavailable)
+    function fetchReply(payload, loadingDiv) {
+        return fetch('/api/chat', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken
+            },
+            body: JSON.stringify(payload)
+        })
+        .then(response => response.json())
+        .then(data => {
+            // Remove loading indicator
+            loadingDiv.remove();
+            
+            // Add bot response
+            if (data.status === 'success') {
+                addMessage(data.response, false);
+            } else {
+                addMessage('Sorry, I encountered an error. Please try again.', false);
+            }
+        });
+    }
+    
+    // Stream the reply as server-sent events, rendering tokens as they arrive
+    function streamReply(payload, loadingDiv) {
+        return fetch('/api/chat/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
+                'X-CSRFToken': csrfToken
+            },
+            body: JSON.stringify(payload)
+        })
+        .then(response => {
+            if (!response.ok || !response.body) {
+                throw new Error(`Streaming request failed: ${response.status}`);
+            }
+            
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let content = null;
+            
+            function handleEvent(event) {
+                const data = event.split('\n')
+                    .filter(line => line.startsWith('data: '))
+                    .map(line => line.slice(6))
+                    .join('\n');
+                if (!data) return;
+                
+                const payload = JSON.parse(data);
+                if (payload.token) {
+                    if (!content) {
+                        // First token: swap the spinner for the reply bubble
+                        loadingDiv.remove();
+                        content = addMessage('', false);
+                    }
+                    content.textContent += payload.token;
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                }
+            }
+            
+            function read() {
+                return reader.read().then(({ done, value }) => {
+                    if (done) {
+                        if (!content) {
+                            loadingDiv.remove();
+                            addMessage('Sorry, I encountered an error. Please try again.', false);
+                        }
+                        return;
+                    }
+                    buffer += decoder.decode(value, { stream: true });
+                    const events = buffer.split('\n\n');
+                    buffer = events.pop();
+                    events.forEach(handleEvent);
+                    return read();
+                });
+            }
+            
+            return read();
+        });
     }
     
     // Handle chat form submission
@@ -60,32 +207,18 @@ document.addEventListener('DOMContentLoaded', function() {
             chatMessages.scrollTop = chatMessages.scrollHeight;
             
             // Send message to server for AI processing
-            fetch('/api/chat', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    message: message,
-                    course_id: courseId
-                })
-            })
-            .then(response => response.json())
-            .then(data => {
-                // Remove loading indicator
-                chatMessages.removeChild(loadingDiv);
-                
-                // Add bot response
-                if (data.status === 'success') {
-                    addMessage(data.response, false);
-                } else {
-                    addMessage('Sorry, I encountered an error. Please try again.', false);
-                }
-            })
-            .catch(error => {
+            const payload = {
+                message: message,
+                course_id: courseId
+            };
+            const request = window.ReadableStream && window.TextDecoder
+                ? streamReply(payload, loadingDiv)
+                : fetchReply(payload, loadingDiv);
+            
+            request.catch(error => {
                 console.error('Error:', error);
                 // Remove loading indicator
-                chatMessages.removeChild(loadingDiv);
+                loadingDiv.remove();
                 
                 // Add error message
                 addMessage('Sorry, I encountered an error connecting to my brain. Please try again.', false);
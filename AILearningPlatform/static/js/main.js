@@ -245,18 +245,74 @@ function updateModuleProgress(courseId, moduleId, quizScore = null) {
         progressBar.textContent = `${completion}%`;
     }
     
-    // Send progress update to server
-    fetch('/update_progress', {
+    // Queue the progress event; queued events are sent in batches
+    queueProgressEvent({
+        course_id: courseId,
+        module_id: moduleId,
+        completion: completion,
+        quiz_score: quizScore
+    });
+}
+
+/**
+ * Progress events waiting to be sent, coalesced per module
+ */
+const PROGRESS_BATCH_URL = '/api/progress/batch';
+const PROGRESS_FLUSH_DELAY_MS = 5000;
+const pendingProgress = new Map();
+let progressFlushTimer = null;
+
+/**
+ * Queue a progress event, replacing any queued event for the same module
+ * 
+ * @param {Object} event - {course_id, module_id, completion, quiz_score}
+ */
+function queueProgressEvent(event) {
+    const key = `${event.course_id}:${event.module_id}`;
+    const previous = pendingProgress.get(key);
+    if (previous && event.quiz_score === null) {
+        // Keep a quiz score reported earlier for this module
+        event.quiz_score = previous.quiz_score;
+    }
+    pendingProgress.delete(key);
+    pendingProgress.set(key, event);
+    
+    if (!progressFlushTimer) {
+        progressFlushTimer = setTimeout(flushProgress, PROGRESS_FLUSH_DELAY_MS);
+    }
+}
+
+/**
+ * Take the queued progress events, leaving the queue empty
+ * 
+ * @returns {Array} The queued events
+ */
+function takeProgressEvents() {
+    clearTimeout(progressFlushTimer);
+    progressFlushTimer = null;
+    const events = Array.from(pendingProgress.values());
+    pendingProgress.clear();
+    return events;
+}
+
+/**
+ * Send queued progress events in one request
+ */
+function flushProgress() {
+    const events = takeProgressEvents();
+    if (events.length === 0) {
+        return;
+    }
+    
+    const csrfMeta = document.querySelector('meta[name="csrf-token"]');
+    fetch(PROGRESS_BATCH_URL, {
         method: 'POST',
+        keepalive: true,
         headers: {
             'Content-Type': 'application/json',
+            'X-CSRFToken': csrfMeta ? csrfMeta.getAttribute('content') : ''
         },
-        body: JSON.stringify({
-            course_id: courseId,
-            module_id: moduleId,
-            completion: completion,
-            quiz_score: quizScore
-        })
+        body: JSON.stringify({ events: events })
     })
     .then(response => response.json())
     .then(data => {
@@ -266,3 +322,30 @@ function updateModuleProgress(courseId, moduleId, quizScore = null) {
         console.error('Error updating progress:', error);
     });
 }
+
+/**
+ * Send queued progress events with navigator.sendBeacon as the page goes away
+ */
+function beaconProgress() {
+    if (pendingProgress.size === 0) {
+        return;
+    }
+    if (!navigator.sendBeacon) {
+        flushProgress();
+        return;
+    }
+    
+    // A beacon cannot set headers, so the CSRF token travels as a form field
+    const csrfMeta = document.querySelector('meta[name="csrf-token"]');
+    const body = new URLSearchParams();
+    body.append('csrf_token', csrfMeta ? csrfMeta.getAttribute('content') : '');
+    body.append('events', JSON.stringify(takeProgressEvents()));
+    navigator.sendBeacon(PROGRESS_BATCH_URL, body);
+}
+
+document.addEventListener('visibilitychange', function() {
+    if (document.visibilityState === 'hidden') {
+        beaconProgress();
+    }
+});
+window.addEventListener('pagehide', beaconProgress);
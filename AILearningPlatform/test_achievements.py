@@ -0,0 +1,75 @@
+"""
+Tests for the achievement rules engine.
+"""
+import achievements
+from conftest import login, count_queries
+from extensions import db
+from models import User, Course, Achievement, UserAchievement
+
+
+def admin_id(app):
+    with app.app_context():
+        return User.query.filter_by(username='admin').first().id
+
+
+def badge_ids(app, user_id):
+    with app.app_context():
+        return sorted(badge_id for (badge_id,) in db.session.query(Achievement.badge_id).join(
+            UserAchievement, UserAchievement.achievement_id == Achievement.id
+        ).filter(UserAchievement.user_id == user_id).all())
+
+
+def test_events_that_earn_nothing_issue_no_queries(app):
+    user_id = admin_id(app)
+    with app.app_context():
+        achievements.get_registry()
+        with count_queries(app) as statements:
+            assert achievements.record_event(user_id, 'login', max_streak=3) == []
+            assert achievements.record_event(user_id, 'progress', score=80) == []
+    assert statements == []
+
+
+def test_badges_are_awarded_once_with_one_bulk_insert(app):
+    user_id = admin_id(app)
+    with app.app_context():
+        achievements.get_registry()
+        with count_queries(app) as statements:
+            awarded = achievements.record_event(user_id, 'quiz_result', score=100,
+                                                course_completed=True, completed_courses=5)
+            db.session.commit()
+        assert [badge['badge_id'] for badge in awarded] == [
+            'badge-perfect-score', 'badge-course-graduate', 'badge-learning-enthusiast'
+        ]
+        assert len([s for s in statements if s.startswith('INSERT INTO user_achievements')]) == 1
+
+        with count_queries(app) as statements:
+            assert achievements.record_event(user_id, 'quiz_result', score=100, course_completed=True) == []
+        assert len(statements) == 1
+    assert len(badge_ids(app, user_id)) == 3
+
+
+def test_enrolling_awards_first_steps(app, client):
+    user_id = admin_id(app)
+    with app.app_context():
+        course_ids = [course.id for course in Course.query.order_by(Course.id).limit(2)]
+    login(client)
+
+    response = client.get(f'/enroll/{course_ids[0]}', follow_redirects=True)
+    assert b'Achievement unlocked: First Steps!' in response.data
+    response = client.get(f'/enroll/{course_ids[1]}', follow_redirects=True)
+    assert b'Achievement unlocked' not in response.data
+    assert badge_ids(app, user_id) == ['badge-first-steps']
+
+
+def test_new_badges_need_only_a_rule(app, monkeypatch):
+    user_id = admin_id(app)
+    monkeypatch.setattr(achievements, 'RULES', list(achievements.RULES))
+    achievements.rule('badge-night-owl', 'login')(lambda facts: facts.get('hour', 12) < 5)
+    with app.app_context():
+        achievements.get_registry()
+        db.session.add(Achievement(title='Night Owl', badge_id='badge-night-owl'))
+        db.session.commit()
+
+        awarded = achievements.record_event(user_id, 'login', hour=3)
+        db.session.commit()
+    assert [badge['title'] for badge in awarded] == ['Night Owl']
@@ -0,0 +1,59 @@
+"""
+Tests for the bulk certificate renderer.
+"""
+import json
+
+import bulk_certificates
+import certificate_storage
+from extensions import db
+from models import User, Course, Enrollment, Certificate, QuizAttempt
+
+
+def add_graduates(app, count):
+    with app.app_context():
+        course = Course.query.order_by(Course.id).first()
+        for i in range(count):
+            user = User(username=f'graduate{i}', email=f'graduate{i}@example.com')
+            user.set_password('secret')
+            db.session.add(user)
+            db.session.flush()
+            # Progress updates store completion as a fraction
+            completion = 1.0 if i % 2 else 100
+            db.session.add(Enrollment(user_id=user.id, course_id=course.id, completion=completion))
+            db.session.add(QuizAttempt(user_id=user.id, course_id=course.id, score=80.0, passed=True))
+        # Completed but never passed the quiz: not eligible
+        dropout = User(username='dropout', email='dropout@example.com')
+        dropout.set_password('secret')
+        db.session.add(dropout)
+        db.session.flush()
+        db.session.add(Enrollment(user_id=dropout.id, course_id=course.id, completion=100))
+        db.session.commit()
+
+
+def test_bulk_render_is_resumable(app, tmp_path):
+    add_graduates(app, 4)
+    manifest = tmp_path / 'manifest.jsonl'
+    output_dir = tmp_path / 'certificates'
+
+    first = bulk_certificates.run(app, workers=2, manifest_path=str(manifest), output_dir=str(output_dir), limit=1)
+    assert (first['created'], first['rendered'], first['failed']) == (4, 1, 0)
+
+    # Simulate an interruption that left a partial line behind
+    with open(manifest, 'a') as f:
+        f.write('{"verification_code": ')
+
+    second = bulk_certificates.run(app, workers=2, manifest_path=str(manifest), output_dir=str(output_dir))
+    assert (second['created'], second['skipped'], second['rendered']) == (0, 1, 3)
+
+    codes = [json.loads(line)['verification_code'] for line in open(manifest) if line.endswith('}\n')]
+    assert len(set(codes)) == 4
+    assert len(list(output_dir.rglob('*.jpg'))) == 4
+    with app.app_context():
+        certificates = Certificate.query.all()
+        assert len(certificates) == 4
+        assert all(
+            certificate_storage.is_stored(certificate_storage.name_from_url(c.certificate_url), str(output_dir))
+            for c in certificates
+        )
+
+    assert bulk_certificates.run(app, workers=2, manifest_path=str(manifest), output_dir=str(output_dir))['rendered'] == 0
@@ -0,0 +1,57 @@
+"""
+Tests for the in-memory course catalog snapshot.
+"""
+from catalog import get_catalog_for_user, get_course_content
+from conftest import login, count_queries
+from extensions import db
+from models import Course, Module, Quiz
+
+
+def test_anonymous_catalog_is_served_from_memory(app, client):
+    assert client.get('/courses').status_code == 200
+
+    with count_queries(app) as statements:
+        assert client.get('/courses').status_code == 200
+        assert client.get('/').status_code == 200
+    assert statements == []
+
+
+def test_catalog_invalidated_by_content_writes(app, client):
+    client.get('/courses')
+    with app.app_context():
+        course = Course.query.first()
+        db.session.add(Module(course_id=course.id, title='Extra', content='...', order=9))
+        db.session.commit()
+        course_id = course.id
+
+    login(client)
+    with count_queries(app) as statements:
+        response = client.get('/courses')
+    assert response.status_code == 200
+    # User loader, catalog rebuild, enrollment overlay
+    assert len(statements) == 3
+
+    with app.app_context():
+        entry = next(c for c in get_catalog_for_user() if c['id'] == course_id)
+        assert entry['module_count'] == 3
+        assert entry['quiz_count'] == Quiz.query.join(Module).filter(Module.course_id == course_id).count()
+        assert entry['enrolled'] is False
+
+
+def test_course_content_compiled_once_per_version(app, client):
+    assert client.get('/course/1').status_code == 200
+    with count_queries(app) as statements:
+        response = client.get('/course/1')
+        assert client.get('/course/999').status_code == 404
+    assert response.status_code == 200
+    assert b'Getting Started with Python' in response.data
+    assert statements == []
+
+    with app.app_context():
+        quiz = Quiz.query.filter_by(question='What is Python?').first()
+        quiz.options = ['A snake', 'A language']
+        db.session.commit()
+
+        content = get_course_content(1)
+        assert content['modules'][0]['quiz'][0]['options'] == ['A snake', 'A language']
+        assert get_course_content(1) is content
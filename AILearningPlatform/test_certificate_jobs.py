@@ -0,0 +1,164 @@
+"""
+Tests for background certificate rendering.
+"""
+import threading
+
+import pytest
+
+import certificate_generator
+import certificate_jobs
+import certificate_storage
+from conftest import login
+from extensions import db
+from models import User, Course, Enrollment, Certificate, QuizQuestion, QuizAttempt
+
+
+@pytest.fixture
+def render_queue(tmp_path, monkeypatch):
+    """A fresh job queue rendering into a scratch directory, with renders counted and gated."""
+    queue = certificate_jobs.CertificateJobQueue(max_workers=2)
+    renders = []
+    gate = threading.Event()
+    real_render = certificate_jobs.render_certificate
+
+    def render(student_name, course_name, certificate_number, date):
+        gate.wait(5)
+        renders.append(certificate_number)
+        return real_render(student_name, course_name, certificate_number, date)
+
+    monkeypatch.setattr(certificate_storage, 'CERTIFICATE_DIR', str(tmp_path))
+    monkeypatch.setattr(certificate_jobs, 'certificate_jobs', queue)
+    monkeypatch.setattr(certificate_jobs, 'render_certificate', render)
+    monkeypatch.setattr('routes.certificate_jobs', queue)
+    queue.renders = renders
+    queue.gate = gate
+    yield queue
+    gate.set()
+    queue.wait(10)
+
+
+def enroll_admin(app, completion):
+    with app.app_context():
+        user = User.query.filter_by(username='admin').first()
+        course = Course.query.order_by(Course.id).first()
+        Enrollment.query.filter_by(user_id=user.id, course_id=course.id).delete()
+        db.session.add(Enrollment(user_id=user.id, course_id=course.id, completion=completion))
+        if completion >= 100:
+            db.session.add(QuizAttempt(user_id=user.id, course_id=course.id, score=90.0, passed=True))
+        db.session.commit()
+        return course.id
+
+
+def test_download_queues_render_and_status_reports_ready(app, client, render_queue):
+    course_id = enroll_admin(app, completion=100)
+    login(client)
+
+    # The request returns straight away with a polling page while the render is held
+    response = client.get(f'/download_certificate/{course_id}')
+    assert response.status_code == 200
+    assert b'data-certificate-status-url' in response.data
+    assert client.get(f'/api/certificate/status/{course_id}').get_json()['status'] in ('queued', 'running')
+
+    # Repeated requests for the same (user, course) share the one job
+    client.get(f'/download_certificate/{course_id}')
+    render_queue.gate.set()
+    render_queue.wait(10)
+    assert len(render_queue.renders) == 1
+
+    status = client.get(f'/api/certificate/status/{course_id}').get_json()
+    assert status['status'] == 'ready'
+    image = client.get(status['url'])
+    assert image.mimetype == 'image/jpeg'
+    assert 'immutable' in image.headers['Cache-Control']
+    assert client.get(status['url'], headers={'If-None-Match': image.headers['ETag']}).status_code == 304
+
+    response = client.get(f'/download_certificate/{course_id}')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith(status['url'])
+    with app.app_context():
+        certificate = Certificate.query.filter_by(course_id=course_id).one()
+        assert certificate.is_rendered and certificate.rendered_at is not None
+        assert status['url'].endswith(certificate_storage.name_from_url(certificate.certificate_url))
+        with open(certificate.pdf_path, 'rb') as f:
+            assert f.read(5) == b'%PDF-'
+
+
+def test_passing_quiz_does_not_render_inline(app, client, render_queue):
+    course_id = enroll_admin(app, completion=0.5)
+    with app.app_context():
+        question = QuizQuestion(course_id=course_id, question='2 + 2?', options=['3', '4'], correct_answer='4')
+        db.session.add(question)
+        db.session.commit()
+        question_id = question.id
+    login(client)
+    client.set_cookie('csrftoken', 'token')
+
+    response = client.post(f'/course/{course_id}/quiz', data={'csrf_token': 'token', f'question_{question_id}': '4'})
+    assert response.status_code == 200
+    assert b'Preparing certificate' in response.data
+    # The render is still held, so the response did not wait for it
+    assert render_queue.renders == []
+
+    render_queue.gate.set()
+    render_queue.wait(10)
+    assert client.get(f'/api/certificate/status/{course_id}').get_json()['status'] == 'ready'
+
+
+def test_renderer_draws_on_a_copy_of_the_cached_base_layer():
+    base = certificate_generator.get_base_layer()
+    snapshot = base.tobytes()
+    first = certificate_generator.render_certificate_image('Ada', 'Python', 'code-1', 'January 01, 2025')
+    second = certificate_generator.render_certificate_image('Grace', 'SQL', 'code-2', 'January 01, 2025')
+
+    assert certificate_generator.get_base_layer() is base
+    assert base.tobytes() == snapshot
+    assert first.tobytes() != second.tobytes()
+
+
+def test_serve_certificate_offloads_to_proxy(app, client, tmp_path, monkeypatch):
+    monkeypatch.setattr(certificate_storage, 'CERTIFICATE_DIR', str(tmp_path))
+    name = certificate_storage.store(b'fake jpeg bytes')
+    assert certificate_storage.store(b'fake jpeg bytes') == name
+    app.config['CERTIFICATE_ACCEL_REDIRECT'] = '/protected-certificates/'
+
+    response = client.get(f'/certificates/{name}')
+    assert response.headers['X-Accel-Redirect'] == f'/protected-certificates/{name}'
+    assert response.data == b''
+    assert response.headers['ETag'] == f'"{certificate_storage.content_key(b"fake jpeg bytes")}"'
+
+    assert client.get('/certificates/../app.py').status_code == 404
+    assert client.get(f'/certificates/00/00/{"0" * 64}.jpg').status_code == 404
+
+
+def test_verification_pages_queue_missing_renders_instead_of_rendering(app, client, render_queue):
+    course_id = enroll_admin(app, completion=100)
+    with app.app_context():
+        user = User.query.filter_by(username='admin').first()
+        db.session.add(Certificate(user_id=user.id, course_id=course_id, score=90.0, verification_code='verify-me'))
+        db.session.commit()
+
+    for path in ('/certificate/verify?code=verify-me', '/auth/verify-certificate?code=verify-me'):
+        response = client.get(path)
+        assert response.status_code == 200
+        assert b'being prepared' in response.data
+    # Both pages returned while the one queued render is still held
+    assert render_queue.renders == []
+
+    render_queue.gate.set()
+    render_queue.wait(10)
+    assert render_queue.renders == ['verify-me']
+    assert b'being prepared' not in client.get('/certificate/verify?code=verify-me').data
+
+
+def test_certificate_score_comes_from_a_passing_attempt(app, client, render_queue):
+    course_id = enroll_admin(app, completion=100)
+    with app.app_context():
+        user = User.query.filter_by(username='admin').first()
+        # A failed retake after the pass must not end up on the certificate
+        db.session.add(QuizAttempt(user_id=user.id, course_id=course_id, score=40.0, passed=False))
+        db.session.commit()
+    login(client)
+
+    client.get(f'/download_certificate/{course_id}')
+    with app.app_context():
+        assert Certificate.query.filter_by(course_id=course_id).one().score == 90.0
@@ -0,0 +1,370 @@
+"""
+Tests for the chatbot FAQ matcher and fallbacks.
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import chatbot
+import datetime
+
+from conftest import login, count_queries
+from extensions import db
+from models import ChatMessage, User
+
+
+def write_faq(path, rows, mtime):
+    with open(path, 'w') as fp:
+        fp.write('Question,Answer,Keywords\n')
+        for question, answer, keywords in rows:
+            fp.write(f'{question},{answer},"{keywords}"\n')
+    os.utime(path, (mtime, mtime))
+
+
+def test_faq_index_matches_and_reloads_on_change(tmp_path, monkeypatch):
+    faq_path = tmp_path / 'faq.csv'
+    write_faq(faq_path, [
+        ('Certificates', 'Finish the final quiz.', 'certificate, quiz'),
+        ('Lists', 'Use a list comprehension.', 'list, comprehension, python'),
+    ], mtime=1000)
+    monkeypatch.setattr(chatbot, 'FAQ_CSV_PATH', str(faq_path))
+    monkeypatch.setattr(chatbot, 'FAQ_RELOAD_CHECK_SECONDS', 0)
+    chatbot.load_faq_data()
+
+    assert chatbot.match_faq('what is a list comprehension') == 'Use a list comprehension.'
+    assert chatbot.match_faq('how do i get my certificate') == 'Finish the final quiz.'
+    assert chatbot.match_faq('unrelated words') is None
+
+    write_faq(faq_path, [('Certificates', 'Open My Certificates.', 'certificate')], mtime=2000)
+    chatbot.reload_faq_if_changed()
+    assert chatbot.match_faq('how do i get my certificate') == 'Open My Certificates.'
+    assert chatbot.match_faq('what is a list comprehension') is None
+
+    monkeypatch.undo()
+    chatbot.load_faq_data()
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible chat completions endpoint."""
+
+    def do_POST(self):
+        server = self.server
+        server.requests += 1
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if server.mode == 'slow':
+            # Longer than the client's read timeout; the client is gone by the time we answer
+            time.sleep(1)
+            return
+        if server.mode == 'delayed':
+            # Slow but within the read timeout, so concurrent callers overlap
+            time.sleep(0.15)
+        if server.mode == 'error':
+            self.send_response(500)
+            self.end_headers()
+            return
+        reply = f"stub reply to {body['messages'][-1]['content']}"
+        if body.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            for token in reply.split(' '):
+                chunk = {
+                    'id': 'chatcmpl-stub',
+                    'object': 'chat.completion.chunk',
+                    'created': 0,
+                    'model': body['model'],
+                    'choices': [{'index': 0, 'delta': {'content': token + ' '}, 'finish_reason': None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+        payload = json.dumps({
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': 0,
+            'model': body['model'],
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': reply},
+            }],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubLLMHandler)
+    server.mode = 'ok'
+    server.requests = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(chatbot, 'LLM_READ_TIMEOUT', 0.3)
+    monkeypatch.setattr(chatbot, 'LLM_MAX_RETRIES', 0)
+    monkeypatch.setattr(chatbot, 'has_api_key', True)
+    monkeypatch.setattr(chatbot, 'client', chatbot.create_llm_client(
+        api_key='test-key', base_url=f'http://127.0.0.1:{server.server_port}/v1'
+    ))
+    monkeypatch.setattr(chatbot, 'llm_breaker', chatbot.CircuitBreaker(failure_threshold=3, reset_timeout=60))
+    monkeypatch.setattr(chatbot, 'response_cache', chatbot.ResponseCache())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_llm_client_is_shared_and_used(stub_llm):
+    first_client = chatbot.client
+    assert chatbot.get_chatbot_response('admin', 'hello there') == 'stub reply to hello there'
+    assert chatbot.get_chatbot_response('admin', 'again') == 'stub reply to again'
+    assert chatbot.client is first_client
+    assert stub_llm.requests == 2
+
+
+def test_response_cache_shares_answers_for_normalized_questions(stub_llm):
+    python_course = {'title': 'Python Basics', 'level': 'Beginner', 'description': ''}
+    assert chatbot.get_chatbot_response('admin', 'What is a list?') == 'stub reply to What is a list?'
+    assert chatbot.get_chatbot_response('bob', '  what IS a   list ') == 'stub reply to What is a list?'
+    assert stub_llm.requests == 1
+
+    # The same question about a specific course is a different answer
+    chatbot.get_chatbot_response('admin', 'what is a list', python_course)
+    assert stub_llm.requests == 2
+    assert chatbot.response_cache.stats() == {'hits': 1, 'misses': 2, 'coalesced': 0, 'size': 2}
+
+
+def test_response_cache_collapses_concurrent_identical_questions(stub_llm):
+    stub_llm.mode = 'delayed'
+    barrier = threading.Barrier(5)
+    responses = []
+
+    def ask():
+        barrier.wait()
+        responses.append(chatbot.get_chatbot_response('admin', 'how do loops work'))
+
+    threads = [threading.Thread(target=ask) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert responses == ['stub reply to how do loops work'] * 5
+    assert stub_llm.requests == 1
+    stats = chatbot.response_cache.stats()
+    assert stats['misses'] == 1 and stats['coalesced'] + stats['hits'] == 4
+
+
+def test_concurrent_identical_streams_share_one_upstream_call(stub_llm):
+    stub_llm.mode = 'delayed'
+    barrier = threading.Barrier(5)
+    answers = []
+
+    def ask():
+        barrier.wait()
+        answers.append(''.join(chatbot.stream_chatbot_response('admin', 'how do loops work')))
+
+    threads = [threading.Thread(target=ask) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [answer.strip() for answer in answers] == ['stub reply to how do loops work'] * 5
+    assert stub_llm.requests == 1
+    stats = chatbot.response_cache.stats()
+    assert stats['misses'] == 1 and stats['coalesced'] + stats['hits'] == 4
+
+
+def test_response_cache_evicts_least_recently_used_and_expired():
+    cache = chatbot.ResponseCache(max_entries=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+    cache._entries['a'] = (time.monotonic() - 61, 1)
+    assert cache.get('a') is None
+    assert cache.stats() == {'hits': 3, 'misses': 2, 'coalesced': 0, 'size': 1}
+
+
+@pytest.mark.parametrize('mode', ['error', 'slow'])
+def test_circuit_breaker_fails_fast_to_fallback(stub_llm, mode):
+    stub_llm.mode = mode
+    for _ in range(3):
+        assert not chatbot.get_chatbot_response('admin', 'tell me about python').startswith('stub')
+    assert chatbot.llm_breaker.state == 'open'
+    assert stub_llm.requests == 3
+
+    # While open, the upstream is not contacted at all
+    start = time.monotonic()
+    response = chatbot.get_chatbot_response('admin', 'tell me about python')
+    assert time.monotonic() - start < 0.1
+    assert response == chatbot.fallback_responses[0]
+    assert stub_llm.requests == 3
+
+    # After the reset timeout a single trial call closes the breaker again
+    stub_llm.mode = 'ok'
+    chatbot.llm_breaker.opened_at -= 60
+    assert chatbot.get_chatbot_response('admin', 'python?') == 'stub reply to python?'
+    assert chatbot.llm_breaker.state == 'closed'
+
+
+def test_abandoned_half_open_stream_releases_the_trial(stub_llm):
+    chatbot.llm_breaker.opened_at = time.monotonic() - 60
+    assert chatbot.llm_breaker.state == 'half-open'
+
+    stream = chatbot.stream_llm_response([{'role': 'user', 'content': 'hello there'}])
+    assert next(stream) == 'stub '
+    # The client disconnects mid-stream
+    stream.close()
+
+    assert chatbot.llm_breaker.state == 'half-open'
+    assert chatbot.get_chatbot_response('admin', 'python?') == 'stub reply to python?'
+    assert chatbot.llm_breaker.state == 'closed'
+
+
+def test_chat_stream_forwards_tokens_and_persists_once(app, client, stub_llm):
+    login(client)
+    response = client.post('/api/chat/stream', json={'message': 'what is a list'})
+    assert response.mimetype == 'text/event-stream'
+
+    events = [json.loads(line[6:]) for line in response.get_data(as_text=True).splitlines() if line.startswith('data: ')]
+    tokens = [event['token'] for event in events if 'token' in event]
+    assert len(tokens) > 1
+    assert ''.join(tokens).strip() == 'stub reply to what is a list'
+    assert events[-1]['done'] is True
+
+    with app.app_context():
+        messages = ChatMessage.query.order_by(ChatMessage.id).all()
+        assert [(m.is_from_user, m.message.strip()) for m in messages] == [
+            (True, 'what is a list'),
+            (False, 'stub reply to what is a list'),
+        ]
+
+
+def test_chat_history_pages_backwards_by_timestamp_and_id(app, client):
+    login(client)
+    with app.app_context():
+        user = User.query.filter_by(username='admin').first()
+        # Pairs share a timestamp, so the id tie-breaker matters
+        base = datetime.datetime(2024, 1, 1)
+        db.session.add_all(ChatMessage(
+            user_id=user.id,
+            message=f'message {i}',
+            timestamp=base + datetime.timedelta(seconds=i // 2),
+            is_from_user=i % 2 == 0
+        ) for i in range(120))
+        db.session.commit()
+
+    with count_queries(app) as statements:
+        page = client.get('/chatbot').get_data(as_text=True)
+    assert 'message 119' in page and 'message 70' in page
+    assert 'message 69<' not in page
+    assert len(statements) <= 5
+
+    seen = []
+    cursor = page.split('data-history-cursor="')[1].split('"')[0]
+    while cursor:
+        data = client.get('/api/chat/history', query_string={'before': cursor, 'limit': 30}).get_json()
+        seen = [m['message'] for m in data['messages']] + seen
+        cursor = data['next_cursor']
+    assert seen == [f'message {i}' for i in range(70)]
+
+    assert client.get('/api/chat/history?before=garbage').status_code == 400
+
+
+def test_chat_exchange_is_one_write_without_course_lookup(app, client, stub_llm):
+    login(client)
+    client.post('/api/chat', json={'message': 'warm up', 'course_id': 'Introduction to Python Programming'})
+
+    with count_queries(app) as statements:
+        response = client.post('/api/chat', json={'message': 'what is a dict', 'course_id': 'Introduction to Python Programming'})
+    assert response.get_json()['response'] == 'stub reply to what is a dict'
+    assert chatbot.response_cache.stats()['size'] == 2
+    writes = [s for s in statements if s.lstrip().upper().startswith('INSERT')]
+    assert len(writes) == 1
+    assert not any('FROM courses' in s for s in statements)
+
+
+def test_write_behind_buffer_bulk_inserts_batches(app, client, stub_llm, monkeypatch):
+    buffer = chatbot.ChatWriteBuffer(batch_size=100, flush_interval=60)
+    monkeypatch.setattr(chatbot, 'CHAT_WRITE_BEHIND', True)
+    monkeypatch.setattr(chatbot, 'chat_write_buffer', buffer)
+    login(client)
+    for i in range(3):
+        client.post('/api/chat', json={'message': f'question {i}'})
+
+    with app.app_context():
+        assert ChatMessage.query.count() == 0
+    assert buffer.pending_count == 6
+
+    with count_queries(app) as statements:
+        assert buffer.flush() == 6
+    assert len([s for s in statements if s.lstrip().upper().startswith('INSERT')]) == 1
+    with app.app_context():
+        assert ChatMessage.query.count() == 6
+
+
+def test_write_behind_buffer_isolates_and_drops_bad_rows(app):
+    buffer = chatbot.ChatWriteBuffer(batch_size=100, flush_interval=60, max_attempts=2, max_pending=4)
+    with app.app_context():
+        user_id = User.query.filter_by(username='admin').first().id
+    now = datetime.datetime.utcnow()
+    good = chatbot.chat_exchange_rows(user_id, 'hello', now, 'hi there', now)
+    bad = {'user_id': user_id, 'message': None, 'timestamp': now, 'is_from_user': True}
+
+    buffer.add(app, [good[0], bad, good[1]])
+    assert buffer.flush() == 2
+    assert buffer.pending_count == 1
+    # The bad row is dropped once it has failed max_attempts flushes
+    assert buffer.flush() == 0
+    assert buffer.pending_count == 0 and buffer.dropped == 1
+    with app.app_context():
+        assert ChatMessage.query.count() == 2
+
+    # While rows cannot be written, only the newest max_pending are kept
+    buffer.add(app, [dict(good[0], message=f'message {i}') for i in range(6)])
+    assert buffer.pending_count == 4 and buffer.dropped == 3
+    assert buffer.flush() == 4
+    with app.app_context():
+        assert ChatMessage.query.filter(ChatMessage.message.like('message %')).count() == 4
+
+
+def test_write_behind_buffer_keeps_rows_while_the_database_is_down(app, monkeypatch):
+    buffer = chatbot.ChatWriteBuffer(batch_size=100, flush_interval=1, max_attempts=2, max_backoff=8)
+    with app.app_context():
+        user_id = User.query.filter_by(username='admin').first().id
+    now = datetime.datetime.utcnow()
+    buffer.add(app, chatbot.chat_exchange_rows(user_id, 'hello', now, 'hi there', now))
+
+    inserts = []
+    down = OperationalError('INSERT INTO chat_messages', {}, Exception('database is down'))
+    monkeypatch.setattr(buffer, '_insert', lambda rows: inserts.append(len(rows)) or down)
+    delays = []
+    for _ in range(5):
+        assert buffer.flush() == 0
+        delays.append(buffer.retry_delay)
+    # One batch insert per flush, no per-row retries, nothing dropped
+    assert inserts == [2] * 5
+    assert buffer.pending_count == 2 and buffer.dropped == 0
+    assert delays == [2, 4, 8, 8, 8]
+
+    monkeypatch.undo()
+    assert buffer.flush() == 2
+    assert buffer.retry_delay is None
+    with app.app_context():
+        assert ChatMessage.query.count() == 2
@@ -0,0 +1,63 @@
+"""
+Tests for the admin dashboard's enrollment and award counters.
+"""
+from conftest import login, count_queries
+from counters import get_enrollment_counts, reconcile_counters
+from extensions import db
+from models import User, Course, Enrollment, Achievement, AchievementAwardCount
+
+
+def award_total(badge_id):
+    achievement = Achievement.query.filter_by(badge_id=badge_id).first()
+    counter = db.session.get(AchievementAwardCount, achievement.id)
+    return counter.total if counter else 0
+
+
+def test_enrollments_and_awards_are_counted_in_their_transaction(app, client):
+    with app.app_context():
+        course_id = Course.query.first().id
+    login(client)
+
+    client.get(f'/enroll/{course_id}')
+
+    with app.app_context():
+        assert get_enrollment_counts() == {course_id: 1}
+        assert award_total('badge-first-steps') == 1
+        assert reconcile_counters() == {'courses': 0, 'achievements': 0}
+
+        # Deleting through the ORM (here via the user cascade) is counted too
+        db.session.delete(User.query.filter_by(username='admin').first())
+        db.session.commit()
+        assert get_enrollment_counts() == {course_id: 0}
+        assert award_total('badge-first-steps') == 0
+
+
+def test_reconcile_rebuilds_counters_after_uncounted_writes(app):
+    with app.app_context():
+        user_id = User.query.filter_by(username='admin').first().id
+        course_ids = [course.id for course in Course.query.limit(2).all()]
+        for course_id in course_ids:
+            db.session.add(Enrollment(user_id=user_id, course_id=course_id))
+        db.session.commit()
+
+        # Query-level deletes bypass the mapper events
+        Enrollment.query.filter_by(course_id=course_ids[0]).delete()
+        db.session.commit()
+        assert get_enrollment_counts() == {course_ids[0]: 1, course_ids[1]: 1}
+
+        assert reconcile_counters() == {'courses': 1, 'achievements': 0}
+        assert get_enrollment_counts() == {course_ids[1]: 1}
+
+
+def test_admin_page_reads_counters_instead_of_scanning(app, client):
+    with app.app_context():
+        course_id = Course.query.first().id
+    login(client)
+    client.get(f'/enroll/{course_id}')
+
+    with count_queries(app) as statements:
+        response = client.get('/admin')
+    assert response.status_code == 200
+    assert 'First Steps' in response.get_data(as_text=True)
+    assert not [s for s in statements if 'FROM enrollments' in s or 'FROM user_achievements' in s]
+    assert not [s for s in statements if 'FROM quizzes' in s]
@@ -0,0 +1,179 @@
+"""
+Tests for the email outbox, against a local stub SMTP server.
+"""
+import socketserver
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import certificate_storage
+import email_outbox
+from extensions import db, mail
+from models import User, Course, Certificate, OutboxEmail
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: accepts everything unless told to fail DATA or a recipient."""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 stub ESMTP')
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 stub')
+            elif command == 'DATA':
+                self.reply('354 end with <CRLF>.<CRLF>')
+                data = b''.join(iter(self.rfile.readline, b'.\r\n'))
+                if self.server.fail_data:
+                    self.reply('451 try again later')
+                else:
+                    self.server.messages.append(data)
+                    self.reply('250 queued')
+            elif command.startswith('RCPT') and any(r.upper() in command for r in self.server.rejected_recipients):
+                self.reply('550 no such user')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp_server(app, monkeypatch):
+    """Point the app's mail settings at a stub SMTP server; emails are sent only by send_pending()."""
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), StubSMTPHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.messages = []
+    server.fail_data = False
+    server.rejected_recipients = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=server.server_address[1],
+                      MAIL_USE_TLS=False, MAIL_SUPPRESS_SEND=False)
+    mail.init_app(app)
+    monkeypatch.setattr(email_outbox, 'OUTBOX_SEND_IN_BACKGROUND', False)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_registration_queues_email_without_contacting_smtp(app, client, smtp_server):
+    response = client.post('/auth/register', data={
+        'username': 'newcomer', 'email': 'newcomer@example.com',
+        'password': 'secret123', 'confirm_password': 'secret123'
+    })
+    assert response.status_code == 302
+    assert smtp_server.connections == 0
+
+    with app.app_context():
+        email = OutboxEmail.query.one()
+        assert email.recipients == ['newcomer@example.com'] and email.status == email_outbox.PENDING
+
+    assert email_outbox.send_pending(app) == 1
+    assert len(smtp_server.messages) == 1
+    assert b'verify-email' in smtp_server.messages[0]
+    with app.app_context():
+        assert OutboxEmail.query.one().status == email_outbox.SENT
+
+
+def test_batches_reuse_one_connection(app, smtp_server, monkeypatch):
+    monkeypatch.setattr(email_outbox, 'OUTBOX_BATCH_SIZE', 3)
+    with app.app_context():
+        for i in range(7):
+            email_outbox.queue_email([f'user{i}@example.com'], f'Hello {i}', body='Hi')
+        db.session.commit()
+
+    assert email_outbox.send_pending(app) == 7
+    assert len(smtp_server.messages) == 7
+    assert smtp_server.connections == 1
+
+
+def test_failures_back_off_and_retry(app, smtp_server):
+    smtp_server.fail_data = True
+    with app.app_context():
+        email_outbox.queue_email(['learner@example.com'], 'Hello', body='Hi')
+        db.session.commit()
+
+    assert email_outbox.send_pending(app) == 0
+    with app.app_context():
+        email = OutboxEmail.query.one()
+        assert email.status == email_outbox.PENDING and email.attempts == 1
+        assert email.next_attempt_at > datetime.utcnow() + timedelta(seconds=20)
+        assert '451' in email.last_error
+
+    # Not due yet: no connection is opened
+    assert email_outbox.send_pending(app) == 0
+    assert smtp_server.connections == 1
+
+    smtp_server.fail_data = False
+    with app.app_context():
+        OutboxEmail.query.one().next_attempt_at = datetime.utcnow()
+        db.session.commit()
+    assert email_outbox.send_pending(app) == 1
+    assert len(smtp_server.messages) == 1
+
+
+def test_one_failing_email_does_not_abort_the_batch(app, smtp_server, tmp_path):
+    smtp_server.rejected_recipients.add('nobody@example.com')
+    with app.app_context():
+        email_outbox.queue_email(['first@example.com'], 'First', body='Hi')
+        email_outbox.queue_email(['nobody@example.com'], 'Refused', body='Hi')
+        email_outbox.queue_email(['learner@example.com'], 'Missing attachment', body='Hi',
+                                 attachment_path=str(tmp_path / 'gone.pdf'))
+        email_outbox.queue_email(['last@example.com'], 'Last', body='Hi')
+        db.session.commit()
+
+    assert email_outbox.send_pending(app) == 2
+    assert len(smtp_server.messages) == 2
+    assert smtp_server.connections == 1
+    with app.app_context():
+        emails = {email.subject: email for email in OutboxEmail.query.all()}
+        assert emails['First'].status == emails['Last'].status == email_outbox.SENT
+        assert emails['First'].attempts == emails['Last'].attempts == 0
+        for subject in ('Refused', 'Missing attachment'):
+            assert emails[subject].status == email_outbox.PENDING and emails[subject].attempts == 1
+        assert '550' in emails['Refused'].last_error
+
+
+def test_certificate_email_reads_attachment_when_sent(app, smtp_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(certificate_storage, 'CERTIFICATE_DIR', str(tmp_path))
+    with app.app_context():
+        user = User.query.filter_by(username='admin').first()
+        course = Course.query.order_by(Course.id).first()
+        certificate = Certificate(user_id=user.id, course_id=course.id, score=90.0, verification_code='mail-me')
+        certificate.record_renders({
+            'jpg': certificate_storage.store(b'jpeg bytes', 'jpg'),
+            'pdf': certificate_storage.store(b'%PDF- fake certificate', 'pdf')
+        })
+        db.session.add(certificate)
+        db.session.commit()
+
+        certificate.send_certificate_email()
+        assert smtp_server.connections == 0
+        assert OutboxEmail.query.one().attachment_path == certificate.pdf_path
+
+    assert email_outbox.send_pending(app) == 1
+    message = smtp_server.messages[0]
+    assert b'application/pdf' in message and b'Certificate_' in message
+
+
+def test_background_sender_drains_after_commit(app, smtp_server, monkeypatch):
+    sender = email_outbox.OutboxSender(poll_interval=0.05)
+    monkeypatch.setattr(email_outbox, 'outbox_sender', sender)
+    monkeypatch.setattr(email_outbox, 'OUTBOX_SEND_IN_BACKGROUND', True)
+    with app.app_context():
+        email_outbox.queue_email(['learner@example.com'], 'Hello', body='Hi')
+        db.session.commit()
+
+    thread = sender._thread
+    assert thread is not None
+    thread.join(5)
+    # The thread exits once nothing is pending
+    assert not thread.is_alive()
+    assert len(smtp_server.messages) == 1
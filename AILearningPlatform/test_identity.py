@@ -0,0 +1,43 @@
+"""
+Tests for the cached Flask-Login user_loader.
+"""
+from conftest import login, count_queries
+from extensions import db
+from models import User
+
+
+def user_queries(statements):
+    return [statement for statement in statements if 'FROM users' in statement]
+
+
+def test_authenticated_requests_skip_the_user_lookup(app, client):
+    login(client)
+    client.get('/api/chat/history')
+
+    with count_queries(app) as statements:
+        assert client.get('/api/chat/history').status_code == 200
+        assert client.get('/api/chat/history').status_code == 200
+    assert user_queries(statements) == []
+
+
+def test_role_change_takes_effect_on_the_next_request(app, client):
+    login(client)
+    client.get('/api/chat/history')
+
+    with app.app_context():
+        User.query.filter_by(username='admin').first().role = 'student'
+        db.session.commit()
+
+    response = client.get('/admin')
+    assert response.status_code == 302
+
+
+def test_writes_through_a_cached_user_are_saved(app, client):
+    login(client)
+    client.get('/api/chat/history')
+
+    client.post('/change-password', data={
+        'current_password': 'admin123', 'new_password': 'new-secret-1', 'confirm_new_password': 'new-secret-1'
+    })
+    with app.app_context():
+        assert User.query.filter_by(username='admin').first().check_password('new-secret-1')
@@ -0,0 +1,82 @@
+"""
+Tests for the incremental leaderboard ranking.
+"""
+import json
+
+import leaderboard
+from conftest import login, count_queries
+from extensions import db
+from leaderboard import RankingIndex
+from models import User, Course, Enrollment
+
+
+def entry(user_id, xp, completed=0):
+    return {'user_id': user_id, 'xp': xp, 'completed_courses': completed}
+
+
+def test_ranking_index_orders_and_updates():
+    index = RankingIndex()
+    index.replace_all([entry(1, 50), entry(2, 200), entry(3, 50, completed=1)])
+    assert [e['user_id'] for e in index.top(10)] == [2, 3, 1]
+    assert index.rank(1) == 3
+
+    index.update(entry(1, 300))
+    assert index.rank(1) == 1
+    assert index.rank(2) == 2
+
+    index.remove(2)
+    assert index.rank(2) is None
+    assert [e['user_id'] for e in index.top(2)] == [1, 3]
+
+
+def leaderboard_json(client):
+    return client.get('/leaderboard', headers={'X-Requested-With': 'XMLHttpRequest'}).get_json()
+
+
+def test_leaderboard_applies_committed_progress_incrementally(app, client):
+    with app.app_context():
+        student = User(username='student', email='student@example.com')
+        student.set_password('secret123')
+        db.session.add(student)
+        db.session.commit()
+
+    login(client)
+    data = leaderboard_json(client)
+    assert [row['username'] for row in data['leaderboard']] == ['admin', 'student']
+
+    with app.app_context():
+        student = User.query.filter_by(username='student').first()
+        course = Course.query.first()
+        db.session.add(Enrollment(user_id=student.id, course_id=course.id, completion=1.0))
+        db.session.commit()
+
+    with count_queries(app) as statements:
+        data = leaderboard_json(client)
+    top = data['leaderboard'][0]
+    assert (top['username'], top['rank'], top['xp'], top['courses_completed']) == ('student', 1, 100, 1)
+    # User loader, course count and one re-aggregation restricted to the changed user
+    assert len(statements) <= 3
+
+
+def test_broadcaster_fans_out_one_computation(app, monkeypatch):
+    monkeypatch.setattr(leaderboard, 'HEARTBEAT_SECONDS', 0.05)
+    broadcaster = leaderboard.LeaderboardBroadcaster(interval=60)
+    streams = [broadcaster.stream(app, lambda snapshot: json.dumps(snapshot['top'])) for _ in range(50)]
+
+    with count_queries(app) as statements:
+        frames = [next(stream) for stream in streams]
+    assert all(frame.startswith('data: ') and '"admin"' in frame for frame in frames)
+    # One ranking rebuild and one course count, however many subscribers there are
+    assert len(statements) == 2
+    assert broadcaster.subscriber_count == 50
+
+    # Nothing changed, so the next frame is a heartbeat rather than a resend
+    assert next(streams[0]) == ": heartbeat\n\n"
+
+    for stream in streams:
+        stream.close()
+    assert broadcaster.subscriber_count == 0
+    thread = broadcaster._thread
+    if thread is not None:
+        thread.join(timeout=5)
+    assert broadcaster._thread is None
@@ -0,0 +1,99 @@
+"""
+Tests for pooled password hashing and rehash on login.
+"""
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import passwords
+from conftest import login
+from extensions import db
+from models import User
+
+
+def admin_hash(app):
+    with app.app_context():
+        return User.query.filter_by(username='admin').first().password_hash
+
+
+def test_outdated_hash_is_upgraded_on_successful_login(app, client):
+    old_hash = generate_password_hash('admin123', method='pbkdf2:sha256:1000')
+    with app.app_context():
+        User.query.filter_by(username='admin').first().password_hash = old_hash
+        db.session.commit()
+
+    login(client, password='wrong-password')
+    assert admin_hash(app) == old_hash
+
+    assert login(client).status_code == 302
+    new_hash = admin_hash(app)
+    assert new_hash.startswith(passwords.password_hasher.method_prefix + '$')
+    assert not passwords.password_hasher.needs_rehash(new_hash)
+
+
+def test_pool_verifies_in_worker_processes():
+    hasher = passwords.PasswordHasher(workers=1, max_pending=4, method='pbkdf2:sha256:1000')
+    try:
+        password_hash = hasher.hash('secret')
+        assert password_hash.startswith('pbkdf2:sha256:1000$')
+        assert hasher.verify(password_hash, 'secret')
+        assert not hasher.verify(password_hash, 'guess')
+    finally:
+        hasher.shutdown()
+
+
+def test_full_queue_sheds_logins(app, client, monkeypatch):
+    hasher = passwords.PasswordHasher(workers=0, max_pending=1)
+    # Another request holds the only slot
+    hasher._slots.acquire()
+    monkeypatch.setattr(passwords, 'password_hasher', hasher)
+
+    response = login(client)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    # Other pages are unaffected
+    assert client.get('/courses').status_code == 200
+
+
+def test_zero_max_pending_is_unbounded():
+    hasher = passwords.PasswordHasher(workers=0, max_pending=0, method='pbkdf2:sha256:1000')
+    assert hasher.verify(hasher.hash('secret'), 'secret')
+
+
+def test_timed_out_hash_is_shed_and_holds_its_slot_until_done(app, client, monkeypatch):
+    hasher = passwords.PasswordHasher(workers=1, max_pending=1, method='pbkdf2:sha256:1000')
+    monkeypatch.setattr(passwords, 'password_hasher', hasher)
+    try:
+        monkeypatch.setattr(passwords, 'PASSWORD_HASH_TIMEOUT_SECONDS', 0.2)
+        with pytest.raises(passwords.PasswordHashingBusy, match='timed out'):
+            hasher._run(time.sleep, 1)
+
+        # The worker is still busy with the abandoned call, so its slot is still taken
+        assert login(client).status_code == 503
+        with pytest.raises(passwords.PasswordHashingBusy, match='in progress'):
+            hasher.hash('secret')
+
+        monkeypatch.setattr(passwords, 'PASSWORD_HASH_TIMEOUT_SECONDS', 10)
+        deadline = time.monotonic() + 10
+        while not hasher._slots.acquire(blocking=False):
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        hasher._slots.release()
+        assert hasher.verify(hasher.hash('secret'), 'secret')
+    finally:
+        hasher.shutdown()
+
+
+def test_change_password_verifies_once(app, client, monkeypatch):
+    login(client)
+    hasher = passwords.PasswordHasher(workers=0)
+    calls = []
+    real_verify = hasher.verify
+    monkeypatch.setattr(hasher, 'verify', lambda *args: calls.append(args) or real_verify(*args))
+    monkeypatch.setattr(passwords, 'password_hasher', hasher)
+
+    client.post('/change-password', data={
+        'current_password': 'admin123', 'new_password': 'admin123', 'confirm_new_password': 'admin123'
+    })
+    assert len(calls) == 1
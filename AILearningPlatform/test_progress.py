@@ -0,0 +1,114 @@
+"""
+Tests for course completion calculations.
+"""
+import json
+
+from conftest import login, count_queries
+from extensions import db
+from models import User, Course, Module, Progress, Enrollment
+from utils import calculate_progress, calculate_progress_bulk
+
+
+def make_course(module_count):
+    course = Course(title=f'Progress Course {module_count}', description='Progress test course')
+    db.session.add(course)
+    db.session.flush()
+    modules = []
+    for i in range(module_count):
+        module = Module(course_id=course.id, title=f'Module {i}', content='...', order=i)
+        db.session.add(module)
+        modules.append(module)
+    db.session.flush()
+    return course, modules
+
+
+def test_calculate_progress_single_and_bulk(app):
+    with app.app_context():
+        user = User.query.filter_by(username='admin').first()
+        course, modules = make_course(60)
+        empty_course, _ = make_course(0)
+        for module in modules[:15]:
+            db.session.add(Progress(user_id=user.id, course_id=course.id, module_id=module.id, completion=1.0))
+        db.session.add(Progress(user_id=user.id, course_id=course.id, module_id=modules[20].id, completion=0.5))
+        user_id, course_id, empty_course_id = user.id, course.id, empty_course.id
+        db.session.commit()
+
+        with count_queries(app) as statements:
+            assert calculate_progress(user_id, course_id) == 0.25
+        assert len(statements) == 1
+        assert calculate_progress(user_id, empty_course_id) == 0.0
+
+        pairs = [(user_id, course_id), (user_id, empty_course_id), (user_id + 1, course_id)]
+        assert calculate_progress_bulk(pairs) == {
+            (user_id, course_id): 0.25,
+            (user_id, empty_course_id): 0.0,
+            (user_id + 1, course_id): 0.0,
+        }
+        assert calculate_progress_bulk([]) == {}
+
+
+def enrolled_course(app, module_count):
+    """Enroll the admin in a new course and return (course_id, module_ids, other_course_id)."""
+    with app.app_context():
+        user = User.query.filter_by(username='admin').first()
+        course, modules = make_course(module_count)
+        other, _ = make_course(0)
+        db.session.add(Enrollment(user_id=user.id, course_id=course.id, completion=0))
+        db.session.commit()
+        return course.id, [module.id for module in modules], other.id
+
+
+def test_progress_batch_upserts_once_and_recomputes_completion(app, client):
+    course_id, module_ids, other_course_id = enrolled_course(app, 20)
+    login(client)
+    client.post('/api/update-progress', json={'course_id': course_id, 'module_id': module_ids[0],
+                                               'completion': 0.5, 'quiz_score': 100})
+
+    events = [{'course_id': course_id, 'module_id': module_id, 'completion': 1.0} for module_id in module_ids[:10]]
+    # Later events for a module replace earlier ones; a missing quiz score keeps the stored one
+    events.append({'course_id': course_id, 'module_id': module_ids[1], 'completion': 0.5, 'quiz_score': 80})
+    events.append({'course_id': other_course_id, 'module_id': module_ids[2], 'completion': 1.0})
+
+    with count_queries(app) as statements:
+        response = client.post('/api/progress/batch', json={'events': events})
+    result = response.get_json()
+    assert result['applied'] == 10 and result['skipped'] == 1
+    assert result['completion'] == {str(course_id): 0.45}
+    assert len([s for s in statements if s.startswith('INSERT INTO progress')]) == 1
+    assert len(statements) <= 8
+
+    with app.app_context():
+        progress = {p.module_id: p for p in Progress.query.filter_by(course_id=course_id).all()}
+        assert len(progress) == 10
+        assert (progress[module_ids[0]].completion, progress[module_ids[0]].quiz_score) == (1.0, 100)
+        assert (progress[module_ids[1]].completion, progress[module_ids[1]].quiz_score) == (0.5, 80)
+        enrollment = Enrollment.query.filter_by(course_id=course_id).one()
+        assert enrollment.completion == 0.45 and enrollment.last_module == module_ids[1]
+
+
+def test_progress_batch_accepts_beacon_form_and_completes_course(app, client):
+    course_id, module_ids, _ = enrolled_course(app, 2)
+    login(client)
+    events = [{'course_id': course_id, 'module_id': module_id, 'completion': 1.0} for module_id in module_ids]
+
+    response = client.post('/api/progress/batch', data={'events': json.dumps(events)})
+    assert response.get_json()['completion'] == {str(course_id): 1.0}
+    assert 'Course Graduate' in [badge['title'] for badge in response.get_json()['achievements']]
+    with app.app_context():
+        assert Enrollment.query.filter_by(course_id=course_id).one().completed_at is not None
+
+    assert client.post('/api/progress/batch', json={'events': [{'course_id': course_id}]}).status_code == 400
+    assert client.post('/api/progress/batch', data={'events': 'not json'}).status_code == 400
+
+
+def test_single_progress_update_requires_enrollment_and_a_course_module(app, client):
+    course_id, module_ids, other_course_id = enrolled_course(app, 2)
+    login(client)
+    response = client.post('/api/update-progress', json={'course_id': other_course_id, 'module_id': module_ids[0]})
+    assert response.status_code == 403
+    response = client.post('/api/update-progress', json={'course_id': course_id, 'module_id': module_ids[-1] + 1000})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Module does not belong to this course'
+    response = client.post('/api/update-progress', json={'course_id': course_id, 'module_id': module_ids[0],
+                                                          'completion': 1.0})
+    assert response.get_json()['status'] == 'success'
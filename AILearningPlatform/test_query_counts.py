@@ -0,0 +1,43 @@
+"""
+Regression tests for the number of SQL statements issued by the busiest pages.
+"""
+from conftest import login, count_queries
+from extensions import db
+from models import User, Course, Enrollment, Achievement, UserAchievement
+
+
+def add_history(app, username, enrollments, achievements):
+    """Give a user the requested number of enrollments and earned badges."""
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        for i in range(enrollments):
+            course = Course(title=f'History Course {username} {i}', description='Filler course')
+            db.session.add(course)
+            db.session.flush()
+            db.session.add(Enrollment(user_id=user.id, course_id=course.id, completion=0.5))
+        for i in range(achievements):
+            achievement = Achievement(title=f'History Badge {username} {i}', badge_id=f'badge-history-{i}')
+            db.session.add(achievement)
+            db.session.flush()
+            db.session.add(UserAchievement(user_id=user.id, achievement_id=achievement.id))
+        db.session.commit()
+
+
+def page_query_count(app, client, path):
+    with count_queries(app) as statements:
+        response = client.get(path)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_dashboard_and_profile_use_constant_queries(app, client):
+    login(client)
+    # Warm the identity cache so both measurements see the same user lookup
+    client.get('/dashboard')
+    baseline = {path: page_query_count(app, client, path) for path in ('/dashboard', '/profile')}
+
+    add_history(app, 'admin', enrollments=40, achievements=20)
+
+    for path, expected in baseline.items():
+        assert page_query_count(app, client, path) == expected
+        assert expected <= 6
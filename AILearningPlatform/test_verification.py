@@ -0,0 +1,131 @@
+"""
+Tests for certificate verification lookups.
+"""
+import pytest
+
+import certificate_storage
+import verification
+from conftest import count_queries
+from extensions import db
+from models import User, Course, Certificate
+
+
+@pytest.fixture
+def rendered_certificate(app, tmp_path, monkeypatch):
+    """A certificate whose image and PDF are already stored."""
+    monkeypatch.setattr(certificate_storage, 'CERTIFICATE_DIR', str(tmp_path))
+    with app.app_context():
+        user = User.query.filter_by(username='admin').first()
+        course = Course.query.order_by(Course.id).first()
+        certificate = Certificate(user_id=user.id, course_id=course.id, score=90.0, verification_code='good-code')
+        certificate.record_renders({
+            'jpg': certificate_storage.store(b'jpeg bytes', 'jpg'),
+            'pdf': certificate_storage.store(b'%PDF- bytes', 'pdf')
+        })
+        db.session.add(certificate)
+        db.session.commit()
+        return course.title
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = verification.BloomFilter(1000)
+    codes = [f"code-{i}" for i in range(1000)]
+    for code in codes:
+        bloom.add(code)
+
+    assert all(code in bloom for code in codes)
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_invalid_codes_are_rejected_without_a_query(app, client, rendered_certificate, monkeypatch):
+    client.get('/certificate/verify?code=good-code')
+    # Misses check for newly issued certificates at most once per refresh interval
+    monkeypatch.setattr(verification, 'FILTER_REFRESH_SECONDS', 60)
+
+    with count_queries(app) as statements:
+        for path in ('/certificate/verify?code=typo', '/auth/verify-certificate?code=scraper-guess'):
+            response = client.get(path)
+            assert b'Invalid verification code' in response.data
+    assert statements == []
+
+
+def test_positive_results_are_cached_until_the_certificate_changes(app, client, rendered_certificate):
+    response = client.get('/certificate/verify?code=good-code')
+    assert rendered_certificate.encode() in response.data
+
+    with count_queries(app) as statements:
+        response = client.get('/auth/verify-certificate?code=good-code')
+    assert b'admin' in response.data
+    assert statements == []
+
+    with app.app_context():
+        certificate = Certificate.query.filter_by(verification_code='good-code').one()
+        certificate.score = 75.0
+        db.session.commit()
+        assert verification.verify_code('good-code')['score'] == 75.0
+
+
+def test_cached_results_expire_for_changes_made_elsewhere(app, client, rendered_certificate, monkeypatch):
+    client.get('/certificate/verify?code=good-code')
+
+    # Another worker process changes the certificate; this process sees no commit event
+    with app.app_context():
+        db.session.execute(db.update(Certificate).where(
+            Certificate.verification_code == 'good-code'
+        ).values(score=60.0))
+        db.session.commit()
+        assert verification.verify_code('good-code')['score'] == 90.0
+
+        monkeypatch.setattr(verification, 'FILTER_REBUILD_SECONDS', 0)
+        assert verification.verify_code('good-code')['score'] == 60.0
+
+        db.session.execute(db.delete(Certificate).where(Certificate.verification_code == 'good-code'))
+        db.session.commit()
+        assert verification.verify_code('good-code') is None
+
+
+def test_certificates_issued_elsewhere_verify_after_a_refresh(app, rendered_certificate, monkeypatch):
+    with app.app_context():
+        verification.verify_code('good-code')
+        certificate = Certificate.query.filter_by(verification_code='good-code').one()
+        # Another worker process issues a certificate; this process sees no commit event
+        db.session.execute(db.insert(Certificate).values(
+            user_id=certificate.user_id, course_id=certificate.course_id, score=80.0,
+            verification_code='issued-elsewhere'
+        ))
+        db.session.commit()
+
+        monkeypatch.setattr(verification, 'FILTER_REFRESH_SECONDS', 60)
+        assert verification.verify_code('issued-elsewhere') is None
+
+        monkeypatch.setattr(verification, 'FILTER_REFRESH_SECONDS', 0)
+        with count_queries(app) as statements:
+            assert verification.verify_code('issued-elsewhere')['score'] == 80.0
+        # One query for the new ids, one for the result
+        assert len(statements) == 2
+
+
+def test_new_certificates_join_the_filter_on_commit(app, rendered_certificate):
+    with app.app_context():
+        assert verification.verify_code('later-code') is None
+        user = User.query.filter_by(username='admin').first()
+        db.session.add(Certificate(user_id=user.id, course_id=Course.query.first().id,
+                                   score=80.0, verification_code='later-code'))
+        db.session.commit()
+        assert verification.verify_code('later-code')['score'] == 80.0
+
+
+def test_batch_verification_uses_one_query(app, client, rendered_certificate):
+    with count_queries(app) as statements:
+        response = client.post('/certificate/api/verify', json={'codes': ['good-code', 'bad-1', 'bad-2']})
+    results = response.get_json()['results']
+    assert results['good-code']['valid'] is True
+    assert results['good-code']['course'] == rendered_certificate
+    assert results['bad-1'] == results['bad-2'] == {'valid': False}
+    # One query to build the filter, one for the codes that passed it
+    assert len(statements) == 2
+
+    assert client.post('/certificate/api/verify', json={'codes': 'good-code'}).status_code == 400
+    too_many = [f"code-{i}" for i in range(verification.MAX_BATCH_CODES + 1)]
+    assert client.post('/certificate/api/verify', json={'codes': too_many}).status_code == 400
@@ -5,6 +5,8 @@ import datetime
 import json
 import random
 import logging
+from sqlalchemy import func, distinct, and_
+from extensions import db
 from models import Progress, Module, Enrollment
 
 def format_date(date_str, format="%Y-%m-%d"):
@@ -15,34 +17,90 @@ def format_date(date_str, format="%Y-%m-%d"):
     except:
         return date_str
 
+def conflict_insert(model, bind=None):
+    """INSERT for the session's database that supports ON CONFLICT clauses.
+
+    Both PostgreSQL and SQLite (3.24+) accept on_conflict_do_nothing() and
+    on_conflict_do_update() on the returned statement. Pass bind when
+    executing on a connection rather than the session (e.g. in flush events).
+    """
+    if (bind or db.session.get_bind()).dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
 def calculate_progress(user_id, course_id):
     """Calculate the overall completion percentage for a user in a specific course.
     Returns a float between 0.0 and 1.0.
     """
-    # Get all modules for the given course
-    course_modules = Module.query.filter_by(course_id=course_id).all()
-    total_modules_in_course = len(course_modules)
+    # Count the course's modules and the ones this user has completed in a single
+    # aggregate query. A module is considered completed if its progress.completion
+    # is 1.0 (>= to handle potential float inaccuracies if progress can exceed 1.0)
+    total_modules_in_course, completed_module_count = db.session.query(
+        func.count(distinct(Module.id)),
+        func.count(distinct(Progress.module_id))
+    ).outerjoin(
+        Progress,
+        and_(
+            Progress.module_id == Module.id,
+            Progress.course_id == Module.course_id,
+            Progress.user_id == user_id,
+            Progress.completion >= 1.0
+        )
+    ).filter(
+        Module.course_id == course_id
+    ).one()
 
-    if total_modules_in_course == 0:
+    if not total_modules_in_course:
         return 0.0 # No modules in the course, so 0% progress
 
-    # Get user's progress for all modules in this course
-    # A module is considered completed if its progress.completion is 1.0 (or very close)
-    completed_module_count = 0
-    for module in course_modules:
-        module_progress = Progress.query.filter_by(
-            user_id=user_id,
-            course_id=course_id,
-            module_id=module.id
-        ).first()
-        if module_progress and module_progress.completion >= 1.0: # Using >= 1.0 to handle potential float inaccuracies if progress can exceed 1.0
-            completed_module_count += 1
-    
-    if total_modules_in_course == 0: # Should be caught above, but defensive check
-        return 0.0
-        
     return float(completed_module_count) / total_modules_in_course
 
+def calculate_progress_bulk(user_course_pairs):
+    """Calculate completion for many (user_id, course_id) pairs at once.
+
+    Uses one grouped query for module totals and one for completed modules,
+    independent of the number of pairs. Returns a dict mapping each
+    (user_id, course_id) pair to a float between 0.0 and 1.0.
+    """
+    pairs = set(user_course_pairs)
+    if not pairs:
+        return {}
+
+    user_ids = {user_id for user_id, _ in pairs}
+    course_ids = {course_id for _, course_id in pairs}
+
+    module_totals = dict(db.session.query(
+        Module.course_id, func.count(Module.id)
+    ).filter(
+        Module.course_id.in_(course_ids)
+    ).group_by(
+        Module.course_id
+    ).all())
+
+    completed_counts = {}
+    completed_rows = db.session.query(
+        Progress.user_id, Module.course_id, func.count(distinct(Progress.module_id))
+    ).join(
+        Module,
+        and_(Module.id == Progress.module_id, Module.course_id == Progress.course_id)
+    ).filter(
+        Progress.user_id.in_(user_ids),
+        Module.course_id.in_(course_ids),
+        Progress.completion >= 1.0
+    ).group_by(
+        Progress.user_id, Module.course_id
+    ).all()
+    for user_id, course_id, completed in completed_rows:
+        completed_counts[(user_id, course_id)] = completed
+
+    progress = {}
+    for pair in pairs:
+        total = module_totals.get(pair[1], 0)
+        progress[pair] = float(completed_counts.get(pair, 0)) / total if total else 0.0
+    return progress
+
 def get_badge_svg_path(achievement_id):
     """Get the path to the SVG for a specific achievement badge"""
     # Map achievement IDs to badge SVG elements
@@ -0,0 +1,264 @@
+"""
+Certificate verification lookups for the e-learning platform.
+
+Most codes submitted to the public verification pages are invalid (typos,
+scrapers), so every process keeps a Bloom filter over all verification
+codes: a code the filter has never seen is rejected without a query.
+Certificates that do verify are kept in an LRU of template-ready results
+for up to FILTER_REBUILD_SECONDS.
+
+New certificates join the filter when their transaction commits. When a
+code misses the filter, certificates issued by other worker processes since
+the filter was loaded (ids above the highest one seen) are added first, at
+most once per FILTER_REFRESH_SECONDS. Changed or deleted certificates, and
+codes reassigned on existing rows elsewhere, are picked up when the filter
+is rebuilt or the cached result expires.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
+
+from extensions import db
+from models import Certificate, User, Course
+
+# How often each process rebuilds its filter from the database; cached
+# results expire after the same time
+FILTER_REBUILD_SECONDS = 60
+# How often a miss may check for certificates issued since the filter was loaded
+FILTER_REFRESH_SECONDS = 1
+FILTER_ERROR_RATE = 0.01
+POSITIVE_CACHE_SIZE = 10000
+MAX_BATCH_CODES = 100
+
+SESSION_ADDED_KEY = 'verification_added_codes'
+SESSION_CHANGED_KEY = 'verification_changed_codes'
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing."""
+
+    def __init__(self, capacity, error_rate=FILTER_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+# (built_at, filter, highest certificate id loaded, refreshed_at), swapped atomically
+_filter = None
+_filter_lock = threading.Lock()
+# code -> (cached_at, result)
+_positive = OrderedDict()
+_positive_lock = threading.Lock()
+
+
+def _add_codes(bloom, rows, max_id):
+    for certificate_id, code in rows:
+        if code:
+            bloom.add(code)
+        max_id = max(max_id, certificate_id)
+    return max_id
+
+
+def build_filter():
+    """Build a filter over every verification code in one query. Requires an app context.
+
+    Returns (filter, highest certificate id loaded).
+    """
+    rows = db.session.query(Certificate.id, Certificate.verification_code).all()
+    # Leave room for the certificates issued before the next rebuild
+    bloom = BloomFilter(max(len(rows) * 2, 1024))
+    max_id = _add_codes(bloom, rows, 0)
+    logging.debug(f"Verification filter built over {len(rows)} codes")
+    return bloom, max_id
+
+
+def get_filter():
+    global _filter
+    current = _filter
+    if current is not None and time.monotonic() - current[0] <= FILTER_REBUILD_SECONDS:
+        return current[1]
+    with _filter_lock:
+        if _filter is None or time.monotonic() - _filter[0] > FILTER_REBUILD_SECONDS:
+            bloom, max_id = build_filter()
+            now = time.monotonic()
+            _filter = (now, bloom, max_id, now)
+        return _filter[1]
+
+
+def refresh_filter():
+    """Add certificates issued since the filter was loaded, at most once per FILTER_REFRESH_SECONDS.
+
+    Requires an app context. Returns True if any codes were added.
+    """
+    global _filter
+    with _filter_lock:
+        current = _filter
+        if current is None or time.monotonic() - current[3] < FILTER_REFRESH_SECONDS:
+            return False
+        built_at, bloom, max_id, _ = current
+        rows = db.session.query(Certificate.id, Certificate.verification_code).filter(
+            Certificate.id > max_id
+        ).all()
+        _filter = (built_at, bloom, _add_codes(bloom, rows, max_id), time.monotonic())
+        return bool(rows)
+
+
+def reset_verification():
+    """Drop the filter and cached results (e.g. when switching databases in tests)."""
+    global _filter
+    _filter = None
+    with _positive_lock:
+        _positive.clear()
+
+
+def certificate_result(certificate, username, course_title):
+    """Template-ready verification result; mirrors the Certificate attributes the pages use."""
+    return {
+        'id': certificate.id,
+        'verification_code': certificate.verification_code,
+        'score': certificate.score,
+        'issue_date': certificate.issue_date,
+        'certificate_url': certificate.certificate_url,
+        'pdf_url': certificate.pdf_url,
+        'is_rendered': certificate.is_rendered,
+        'user': {'username': username},
+        'course': {'title': course_title}
+    }
+
+
+def _cached(code):
+    with _positive_lock:
+        entry = _positive.get(code)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > FILTER_REBUILD_SECONDS:
+            del _positive[code]
+            return None
+        _positive.move_to_end(code)
+        return entry[1]
+
+
+def _remember(result):
+    # Rendered files never change, so only fully rendered results are cached
+    if not result['is_rendered']:
+        return
+    with _positive_lock:
+        _positive[result['verification_code']] = (time.monotonic(), result)
+        _positive.move_to_end(result['verification_code'])
+        while len(_positive) > POSITIVE_CACHE_SIZE:
+            _positive.popitem(last=False)
+
+
+def _load(codes):
+    rows = db.session.query(
+        Certificate, User.username, Course.title
+    ).join(
+        User, Certificate.user_id == User.id
+    ).join(
+        Course, Certificate.course_id == Course.id
+    ).filter(
+        Certificate.verification_code.in_(codes)
+    ).all()
+    return {certificate.verification_code: certificate_result(certificate, username, title)
+            for certificate, username, title in rows}
+
+
+def verify_codes(codes):
+    """Return {code: result or None} for many codes using at most one query.
+
+    Requires an app context. Callers must not mutate the results.
+    """
+    bloom = get_filter()
+    codes = list(dict.fromkeys(codes))
+    # A miss may be a certificate another worker issued since the filter was loaded
+    if any(code and code not in bloom for code in codes):
+        refresh_filter()
+    results = {}
+    pending = []
+    for code in codes:
+        if not code or code not in bloom:
+            results[code] = None
+            continue
+        cached = _cached(code)
+        if cached is not None:
+            results[code] = cached
+        else:
+            pending.append(code)
+
+    if pending:
+        loaded = _load(pending)
+        for code in pending:
+            result = loaded.get(code)
+            if result is not None:
+                _remember(result)
+            results[code] = result
+    return results
+
+
+def verify_code(code):
+    """Return the verification result for one code, or None if it is not valid."""
+    return verify_codes([code])[code]
+
+
+# Change tracking: new codes join the filter and changed certificates leave the
+# positive cache once the transaction commits
+def _track_insert(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and target.verification_code:
+        session.info.setdefault(SESSION_ADDED_KEY, set()).add(target.verification_code)
+
+
+def _track_change(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        return
+    history = inspect(target).attrs.verification_code.history
+    codes = {code for code in (target.verification_code, *history.deleted) if code}
+    session.info.setdefault(SESSION_CHANGED_KEY, set()).update(codes)
+    if history.added and target.verification_code:
+        session.info.setdefault(SESSION_ADDED_KEY, set()).add(target.verification_code)
+
+
+event.listen(Certificate, 'after_insert', _track_insert)
+event.listen(Certificate, 'after_update', _track_change)
+event.listen(Certificate, 'after_delete', _track_change)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_changes(session):
+    changed = session.info.pop(SESSION_CHANGED_KEY, None)
+    if changed:
+        with _positive_lock:
+            for code in changed:
+                _positive.pop(code, None)
+    added = session.info.pop(SESSION_ADDED_KEY, None)
+    current = _filter
+    if added and current is not None:
+        for code in added:
+            current[1].add(code)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(SESSION_CHANGED_KEY, None)
+    session.info.pop(SESSION_ADDED_KEY, None)